@@ -0,0 +1,78 @@
+"""列表页解析后端微基准
+
+对样本目录中的每个页面分别用 bs4 和 lxml 后端解析，先校验两者输出完全一致，
+再统计每页平均耗时和加速比。
+
+用法: python benchmarks/bench_parser.py [--fixtures DIR] [--rounds 20]
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pull import PARSER_BACKENDS, BangumiScraper, ScraperConfig  # noqa: E402
+
+FIXTURE_NAME = re.compile(r'(\d{4})-(\d{2})_p(\d+)\.html$')
+
+
+def load_pages(fixture_dir: str):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, '*.html'))):
+        match = FIXTURE_NAME.search(path)
+        year, month = (int(match.group(1)), int(match.group(2))) if match else (2000, None)
+        with open(path, 'rb') as f:
+            pages.append((os.path.basename(path), f.read(), year, month))
+    return pages
+
+
+def check_identical(pages) -> int:
+    """校验所有后端的输出一致，返回条目总数"""
+    scrapers = {backend: BangumiScraper(ScraperConfig(parser_backend=backend)) for backend in PARSER_BACKENDS}
+    total = 0
+    for name, body, year, month in pages:
+        outputs = {backend: scraper.parse_listing(body, year, month) for backend, scraper in scrapers.items()}
+        expected = outputs[PARSER_BACKENDS[0]]
+        for backend, output in outputs.items():
+            if output != expected:
+                raise SystemExit(f'❌ {name}: {backend} 后端输出与 {PARSER_BACKENDS[0]} 不一致')
+        total += len(expected[1])
+    return total
+
+
+def bench(pages, rounds: int):
+    results = {}
+    for backend in PARSER_BACKENDS:
+        scraper = BangumiScraper(ScraperConfig(parser_backend=backend))
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for _, body, year, month in pages:
+                scraper.parse_listing(body, year, month)
+        results[backend] = (time.perf_counter() - start) / (rounds * len(pages))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Listing parser micro-benchmark')
+    parser.add_argument('--fixtures', default=os.path.join(os.path.dirname(__file__), 'fixtures', 'listing'))
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    pages = load_pages(args.fixtures)
+    if not pages:
+        raise SystemExit(f'未找到样本页面: {args.fixtures}')
+
+    items = check_identical(pages)
+    print(f'✅ 输出一致 | 页面: {len(pages)} | 条目: {items}')
+
+    results = bench(pages, args.rounds)
+    baseline = results[PARSER_BACKENDS[0]]
+    for backend, per_page in results.items():
+        print(f'{backend:>5}: {per_page * 1000:7.2f} ms/页 | {1 / per_page:8.1f} 页/秒 | 加速比 {baseline / per_page:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""端到端流水线基准
+
+分阶段计时并统计吞吐量和峰值内存（tracemalloc）：
+  parse      解析样本列表页
+  merge      合成条目首次合并入库，随后以 10% 变化的批次再次合并
+  render     由存储生成单文件报告和按年份分片报告
+  stats      由存储生成统计报告（连续两次，第二次与第一次对比）
+  reparse    重新解析生成的单文件报告
+  crawl      对本地替身服务器的完整爬取（可配置延迟和错误率）
+  recrawl    在 crawl 的数据库上再次爬取同一范围：页面指纹未变化，跳过解析与合并（--reparse 时照常处理）
+
+用法: python benchmarks/bench_pipeline.py [--rows 50000] [--crawl-years 2015-2024] [--latency 0.05]
+      [--error-rate 0.02] [--concurrent 3] [--stages parse,merge,render,stats,reparse,crawl,recrawl] [--json out.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import replace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import aiohttp  # noqa: E402
+
+import pull  # noqa: E402
+from bench_parser import load_pages  # noqa: E402
+from fixture_server import DEFAULT_FIXTURE_DIR, FixtureServer  # noqa: E402
+from make_fixtures import synthetic_records  # noqa: E402
+
+STAGES = ('parse', 'merge', 'render', 'stats', 'reparse', 'crawl', 'recrawl')
+
+
+class StageTimer:
+    """记录每个阶段的耗时、处理量和峰值内存"""
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.results = []
+
+    def run(self, name: str, unit: str, func, *args):
+        """执行 func，其返回值为处理量"""
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            count = func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else 0
+            if self.trace_memory:
+                tracemalloc.stop()
+        result = {'stage': name, 'seconds': round(elapsed, 4), 'count': count, 'unit': unit,
+                  'per_second': round(count / elapsed, 1) if elapsed else 0.0,
+                  'peak_mb': round(peak / 1024 / 1024, 1)}
+        self.results.append(result)
+        memory = f"{result['peak_mb']:8.1f} MB" if self.trace_memory else '       - MB'
+        print(f"{name:>8}: {elapsed:8.3f} s | {count:>8} {unit:<6} | {result['per_second']:>10.1f} {unit}/s | 峰值 {memory}")
+        return result
+
+
+def bench_parse(pages, rounds: int, backend: str) -> int:
+    items = 0
+    for _ in range(rounds):
+        for _, body, year, month in pages:
+            items += len(pull.parse_listing_page(body, year, month, backend)[1])
+    return items
+
+
+def bench_merge(store: pull.AnimeStore, records) -> int:
+    store.upsert(records)
+    rng = random.Random(7)
+    changed = [replace(record, votes=record.votes + 1) if rng.random() < 0.1 else record for record in records]
+    result = store.upsert(changed)
+    assert result.changed == sum(a is not b for a, b in zip(records, changed))
+    return len(records) * 2
+
+
+def bench_render(scraper: pull.BangumiScraper, markdown_path: str, shard_dir: str) -> int:
+    scraper.write_markdown(markdown_path)
+    scraper.write_shards(shard_dir)
+    return scraper.store.count()
+
+
+def bench_stats(store: pull.AnimeStore, directory: str) -> int:
+    report = pull.StatsReport(store)
+    for _ in range(2):
+        report.write(os.path.join(directory, 'Bangumi_Stats.md'), os.path.join(directory, 'stats.json'))
+    return store.count() * 2
+
+
+def bench_reparse(scraper: pull.BangumiScraper, markdown_path: str) -> int:
+    return len(scraper.parse_existing_markdown(markdown_path))
+
+
+async def crawl(args, db_path: str) -> int:
+    server = FixtureServer(args.fixtures, args.latency, args.error_rate)
+    base_url = pull.BASE_URL
+    pull.BASE_URL = await server.start()
+    start_year, end_year = pull.BangumiScraper.process_year_input(args.crawl_years)
+    try:
+        config = pull.ScraperConfig(concurrency=args.concurrent, max_concurrency=args.max_concurrent,
+                                    rate_limit=args.rate_limit, max_retries=args.max_retries,
+                                    parser_backend=args.parser, parse_executor=args.parse_executor,
+                                    skip_unchanged=not args.reparse)
+        async with pull.BangumiScraper(config) as scraper:
+            scraper.store = pull.AnimeStore(db_path)
+            async with aiohttp.ClientSession(connector=scraper.connector) as session:
+                await scraper.scrape_time_range(session, start_year, end_year)
+            pages = scraper.store.conn.execute(
+                "SELECT COUNT(*) FROM crawl_manifest WHERE status = 'done'").fetchone()[0]
+            skipped = scraper.metrics.summary()['counters'].get('listing_pages_total', {}).get('result=unchanged', 0)
+    finally:
+        pull.BASE_URL = base_url
+        await server.stop()
+    print(f"   crawl: 请求 {server.stats['requests']} 次 | 注入 503: {server.stats['503']} | 429: {server.stats['429']} | "
+          f"指纹未变化: {skipped} 页")
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end pipeline benchmark')
+    parser.add_argument('--stages', default=','.join(STAGES), help=f'Comma-separated subset of {STAGES}')
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURE_DIR)
+    parser.add_argument('--rounds', type=int, default=10, help='Parse stage rounds over the fixture corpus')
+    parser.add_argument('--parser', choices=pull.PARSER_BACKENDS, default=pull.DEFAULT_PARSER)
+    parser.add_argument('--rows', type=int, default=50000, help='Synthetic records for merge/render/reparse')
+    parser.add_argument('--crawl-years', default='2015-2024', help='Year range crawled from the stand-in server')
+    parser.add_argument('--latency', type=float, default=0.05, help='Stand-in server mean latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Stand-in server 503/429 rate')
+    parser.add_argument('--concurrent', type=int, default=pull.DEFAULT_CONCURRENT)
+    parser.add_argument('--max-concurrent', type=int, help='Adaptive concurrency ceiling (default: 4x --concurrent)')
+    parser.add_argument('--rate-limit', type=float, default=1000.0, help='Requests per second (default: effectively off)')
+    parser.add_argument('--max-retries', type=int, default=pull.DEFAULT_MAX_RETRIES)
+    parser.add_argument('--parse-executor', choices=pull.PARSE_EXECUTORS, default='inline')
+    parser.add_argument('--reparse', action='store_true', help='Disable page fingerprint skipping in crawl stages')
+    parser.add_argument('--no-memory', action='store_true', help='Skip tracemalloc (it slows every stage down)')
+    parser.add_argument('--json', metavar='PATH', help='Write stage results as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Keep the scraper INFO logs')
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise SystemExit(f'未知阶段: {", ".join(sorted(unknown))}')
+
+    timer = StageTimer(trace_memory=not args.no_memory)
+    with tempfile.TemporaryDirectory() as tmp:
+        scraper = pull.BangumiScraper(pull.ScraperConfig(parser_backend=args.parser))
+        scraper.store = pull.AnimeStore(os.path.join(tmp, 'bench.db'))
+        markdown_path = os.path.join(tmp, 'Bangumi_Anime.md')
+
+        if 'parse' in stages:
+            pages = load_pages(args.fixtures)
+            if not pages:
+                raise SystemExit(f'未找到样本页面: {args.fixtures}')
+            timer.run('parse', '条', bench_parse, pages, args.rounds, args.parser)
+        if {'merge', 'render', 'stats', 'reparse'} & set(stages):
+            records = synthetic_records(args.rows)
+            timer.run('merge', '条', bench_merge, scraper.store, records)
+            del records
+        if 'render' in stages or 'reparse' in stages:
+            timer.run('render', '条', bench_render, scraper, markdown_path, os.path.join(tmp, 'shards'))
+        if 'stats' in stages:
+            import pandas  # noqa: F401  # 导入耗时不计入统计阶段
+            timer.run('stats', '条', bench_stats, scraper.store, tmp)
+        if 'reparse' in stages:
+            timer.run('reparse', '条', bench_reparse, scraper, markdown_path)
+        scraper.store.close()
+
+        for stage in ('crawl', 'recrawl'):
+            if stage in stages:
+                timer.run(stage, '页', lambda: asyncio.run(crawl(args, os.path.join(tmp, 'crawl.db'))))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'stages': timer.results}, f, ensure_ascii=False, indent=2)
+        print(f'📝 结果已保存至: {args.json}')
+
+
+if __name__ == '__main__':
+    main()
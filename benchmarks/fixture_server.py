@@ -0,0 +1,144 @@
+"""本地 Bangumi 替身服务器
+
+用样本目录中的列表页响应 /anime/browser/airtime/<年份[-月份]>?page=N，样本中没有的页面
+按 make_fixtures 的页面结构确定性生成；/subject/<id> 返回合成的条目详情页。
+可配置响应延迟和错误率（503 与带 Retry-After 的 429 各占一半），用于在无网络的情况下
+端到端测试爬虫的并发、限速和重试行为。
+
+用法:
+    python benchmarks/fixture_server.py [--port 8765] [--latency 0.05] [--error-rate 0.02]
+    BANGUMI_BASE_URL=http://127.0.0.1:8765 python pull.py auto --year 2024 --no-cache
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from make_fixtures import ITEMS_PER_PAGE, render_page  # noqa: E402
+
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'listing')
+SPEC_PATTERN = re.compile(r'(\d{4})(?:-(\d{1,2}))?$')
+
+SUBJECT_PAGE = '''<html><head><meta http-equiv="Content-Type" content="text/html; charset=utf-8" /></head><body>
+<div id="bangumiInfo"><ul id="infobox">
+<li><span class="tip">中文名: </span>动画{sid}</li>
+<li><span class="tip">话数: </span>{eps}</li>
+<li><span class="tip">放送开始: </span>{year}年{month}月{day}日</li>
+<li><span class="tip">动画制作: </span><a href="/person/{studio}" class="l">Studio {studio}</a></li>
+</ul></div>
+<div class="global_score"><span class="number">{score}</span>
+<small class="grey">Bangumi Anime Ranked:</small><small class="alarm">#{rank}</small></div>
+<div class="subject_tag_section"><div class="inner">{tags}</div></div>
+</body></html>'''
+
+
+class FixtureServer:
+    """可在进程内启动的替身服务器，stats 记录请求数和注入的错误数"""
+
+    def __init__(self, fixture_dir: str = DEFAULT_FIXTURE_DIR, latency: float = 0.05, error_rate: float = 0.0,
+                 pages: int = 3, seed: int = 0):
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.error_rate = error_rate
+        self.pages = pages
+        self.rng = random.Random(seed)
+        self.stats = {'requests': 0, '503': 0, '429': 0}
+        self.runner = None
+        self.url = None
+
+    async def delay_or_error(self):
+        """模拟延迟（均值为 latency 的均匀抖动），按错误率返回错误响应"""
+        self.stats['requests'] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+        roll = self.rng.random()
+        if roll < self.error_rate / 2:
+            self.stats['503'] += 1
+            return web.Response(status=503)
+        if roll < self.error_rate:
+            self.stats['429'] += 1
+            return web.Response(status=429, headers={'Retry-After': '1'})
+        return None
+
+    def listing_page(self, spec: str, page: int) -> str:
+        path = os.path.join(self.fixture_dir, f'{spec}_p{page}.html')
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                return f.read()
+        match = SPEC_PATTERN.match(spec)
+        year, month = int(match.group(1)), int(match.group(2) or 0)
+        rng = random.Random(f'{spec}-{page}')
+        count = ITEMS_PER_PAGE if page < self.pages else rng.randint(1, ITEMS_PER_PAGE)
+        return render_page(rng, year, month or rng.randint(1, 12), page, self.pages, count)
+
+    async def listing(self, request: web.Request) -> web.Response:
+        if error := await self.delay_or_error():
+            return error
+        spec = request.match_info['spec']
+        if not SPEC_PATTERN.match(spec):
+            return web.Response(status=404)
+        page = int(request.query.get('page', 1))
+        return web.Response(text=self.listing_page(spec, page), content_type='text/html')
+
+    async def subject(self, request: web.Request) -> web.Response:
+        if error := await self.delay_or_error():
+            return error
+        sid = int(request.match_info['sid'])
+        rng = random.Random(sid)
+        tags = ''.join(f'<a href="/anime/tag/{tag}" class="l"><span>{tag}</span> <small class="grey">{rng.randint(1, 900)}</small></a>'
+                       for tag in rng.sample(['TV', '原创', '漫画改', '奇幻', '日常', '科幻', '2024'], 3))
+        return web.Response(text=SUBJECT_PAGE.format(
+            sid=sid, eps=rng.choice([12, 13, 24]), year=rng.randint(1990, 2024), month=rng.randint(1, 12),
+            day=rng.randint(1, 28), studio=rng.randint(1, 40), score=rng.randint(30, 95) / 10,
+            rank=rng.randint(1, 9000), tags=tags), content_type='text/html')
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/anime/browser/airtime/{spec}', self.listing)
+        app.router.add_get(r'/subject/{sid:\d+}', self.subject)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """启动服务器并返回其地址；port 为 0 时使用随机空闲端口"""
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://{host}:{port}'
+        return self.url
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+
+async def serve(args):
+    server = FixtureServer(args.fixtures, args.latency, args.error_rate, args.pages, args.seed)
+    url = await server.start(args.host, args.port)
+    print(f'🧪 替身服务器已启动: {url} | 延迟: {args.latency}s | 错误率: {args.error_rate:.0%}')
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local Bangumi stand-in server')
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURE_DIR)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='Mean response latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503/429')
+    parser.add_argument('--pages', type=int, default=3, help='Pages per month for generated listings')
+    parser.add_argument('--seed', type=int, default=0)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,209 @@
+"""生成列表页基准测试样本
+
+按 bangumi.tv /anime/browser/airtime 列表页的页面结构生成确定性的 HTML 样本，
+覆盖各种日期格式、缺失封面/日文标题/评分、HTML 实体等情况；
+可选生成大规模的合成 Markdown 报告。
+
+用法: python benchmarks/make_fixtures.py [--out benchmarks/fixtures/listing] [--markdown PATH --rows 50000]
+"""
+import argparse
+import os
+import random
+import sys
+from html import escape
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ITEMS_PER_PAGE = 24
+
+TITLES = ['葬送的芙莉莲', '药屋少女的呢喃', '我推的孩子', '迷宫饭', '鬼灭之刃 柱训练篇', '怪兽8号',
+          '间谍过家家', '孤独摇滚！', '物语系列 离物语&怪物语', '无职转生 Ⅱ ～到了异世界就拿出真本事～',
+          'Re:从零开始的异世界生活 第三季', '蔚蓝档案 The Animation', '少女乐队 <Girls Band Cry>']
+JP_TITLES = ['葬送のフリーレン', '薬屋のひとりごと', '【推しの子】', 'ダンジョン飯', '鬼滅の刃 柱稽古編',
+             '怪獣8号', 'SPY×FAMILY', 'ぼっち・ざ・ろっく！', '〈物語〉シリーズ オフ&モンスターシーズン',
+             '無職転生 Ⅱ ～異世界行ったら本気だす～', 'Re:ゼロから始める異世界生活 3rd season']
+STAFF = ['斋藤圭一郎', '长沼范裕', '平牧大辅', '宫岛善博', '外崎春雄', '宫繁之', '古桥一浩', '斋藤圭一郎']
+
+HEADER = '''<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="zh-CN" lang="zh-CN">
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8" />
+<title>{year}年{month_label}动画 | Bangumi 番组计划</title>
+<link rel="stylesheet" type="text/css" href="/min/g=css?r=2024" />
+<script type="text/javascript" src="/min/g=js?r=2024"></script>
+<script type="text/javascript">var CHOBITS_UID = 0; var SITE_URL = 'https://bangumi.tv';</script>
+</head>
+<body class="bangumiChannel">
+<div id="wrapperNeue" class="wrapperNeue">
+<div id="headerNeue2"><div class="headerNeueInner clearit">
+<a href="/" class="logo">Bangumi 番组计划</a>
+<ul id="navMenuNeue" class="clearit">{nav}</ul>
+<div id="headerSearchWrapper"><form action="/subject_search" method="post"><input type="text" name="search_text" class="inputtext" /></form></div>
+</div></div>
+<div id="main" class="png_bg"><div id="columnSubjectBrowserA" class="column">
+<div class="section"><div class="clearit"><ul class="browserTypeSelector">{filters}</ul></div></div>
+<div id="browserTools" class="clearit"><ul class="grid"><li><a href="?sort=rank">排名</a></li><li><a href="?sort=date" class="focus">日期</a></li></ul></div>
+'''
+
+FOOTER = '''<div id="multipage">{pager}</div>
+</div>
+<div id="columnSubjectBrowserB" class="column"><div class="SidePanel png_bg"><h2>放送时间</h2><ul class="clearit">{sidebar}</ul></div></div>
+</div>
+<div id="footer"><div class="footerInner"><p class="grey">© 2008-2024 Bangumi (a.k.a.Chobits), some rights reserved | r1200</p></div></div>
+</div>
+<script type="text/javascript">chiiLib.browser.init(); $(function(){{ chiiLib.ukagaka.init(); }});</script>
+</body>
+</html>
+'''
+
+
+def render_item(rng: random.Random, subject_id: int, year: int, month: int, index: int) -> str:
+    """生成单个条目，随机覆盖各种边界情况"""
+    title = escape(rng.choice(TITLES) + ('' if rng.random() < 0.7 else f' 第{rng.randint(2, 5)}季'))
+    jp_title = '' if rng.random() < 0.15 else \
+        f' <small class="grey">{escape(rng.choice(JP_TITLES))}</small>'
+
+    roll = rng.random()
+    if roll < 0.08:
+        cover = f'<img src="" data-cfsrc="//lain.bgm.tv/pic/cover/c/{subject_id % 97:02x}/{subject_id}_x.jpg" class="cover" />'
+    elif roll < 0.14:
+        cover = '<img src="/img/no_icon_subject.png" class="cover" />'
+    else:
+        cover = f'<img src="//lain.bgm.tv/r/400/pic/cover/l/{subject_id % 97:02x}/{subject_id}_c.jpg" class="cover" />'
+
+    day = rng.randint(1, 28)
+    roll = rng.random()
+    if roll < 0.45:
+        date = f'{year}年{month}月{day}日'
+    elif roll < 0.65:
+        date = f'{year}-{month:02d}-{day:02d}'
+    elif roll < 0.72:
+        date = f'{year}-{month:02d}-{day:02d}(日本)'
+    elif roll < 0.8:
+        date = f'{year}年{month}月'
+    elif roll < 0.86:
+        date = f'{year}-{month:02d}'
+    elif roll < 0.93:
+        date = f'{year}年'
+    else:
+        date = f'{year}'
+    eps = '' if rng.random() < 0.2 else f'{rng.choice([1, 2, 6, 12, 13, 24, 26, 52])}话 / '
+    info = f'{eps}{date} / {escape(rng.choice(STAFF))} / 原作'
+
+    roll = rng.random()
+    if roll < 0.25:
+        rate = ''
+    elif roll < 0.4:
+        rate = f'''<p class="rateInfo">
+<span class="starstop-s"><span class="starlight stars7"></span></span> <span class="number">{rng.randint(30, 95) / 10:.1f}</span> <span class="tip_j">({rng.randint(10, 90000)}人评分)</span>
+</p>'''
+    elif roll < 0.5:
+        rate = '<p class="rateInfo"><span class="tip_j">(少于10人评分)</span></p>'
+    else:
+        rate = f'''<p class="rateInfo">
+<span class="starstop-s"><span class="starlight stars8"></span></span> <small class="fade">{rng.randint(30, 95) / 10:.1f}</small> <span class="tip_j">({rng.randint(10, 90000)}人评分)</span>
+</p>'''
+
+    parity = 'odd' if index % 2 == 0 else 'even'
+    return f'''<li id="item_{subject_id}" class="item {parity} clearit">
+<a href="/subject/{subject_id}" class="subjectCover cover ll">
+<span class="image">
+{cover}
+</span>
+<span class="overlay"></span>
+</a>
+<div class="inner">
+<h3>
+<span class="ico_subject_type subject_type_2 ll"></span>
+<a href="/subject/{subject_id}" class="l">{title}</a>{jp_title}
+</h3>
+<span class="rank"><small>Rank </small>{rng.randint(1, 9000)}</span>
+<p class="info tip">
+{info}
+</p>
+{rate}
+<div class="collectBlock tip_i"><ul class="collectMenu"><li><a href="/subject/{subject_id}/interest" class="collect_btn">收藏</a></li></ul></div>
+</div>
+</li>'''
+
+
+def render_page(rng: random.Random, year: int, month: int, page: int, total_pages: int, count: int) -> str:
+    nav = ''.join(f'<li><a href="/{name}" class="top">{name}</a></li>'
+                  for name in ('anime', 'book', 'music', 'game', 'real', 'mono'))
+    filters = ''.join(f'<li><a href="/anime/browser/{kind}">{kind}</a></li>'
+                      for kind in ('tv', 'web', 'ova', 'movie', 'misc'))
+    sidebar = ''.join(f'<li><a href="/anime/browser/airtime/{year}-{m}">{m}月</a></li>' for m in range(1, 13))
+    items = '\n'.join(render_item(rng, year * 10000 + month * 500 + page * 30 + i, year, month, i)
+                      for i in range(count))
+    pages = ''.join(f'<strong class="p_cur">{p}</strong>' if p == page else
+                    f'<a href="?sort=date&amp;page={p}" class="p">{p}</a>'
+                    for p in range(1, total_pages + 1))
+    if page < total_pages:
+        pages += f'<a href="?sort=date&amp;page={page + 1}" class="p">&rsaquo;&rsaquo;</a>'
+    pager = f'<div class="page_inner">{pages}</div>' if total_pages > 1 else ''
+    return (HEADER.format(year=year, month_label=f'{month}月', nav=nav, filters=filters)
+            + f'<ul id="browserItemList" class="browserFull">\n{items}\n</ul>\n'
+            + FOOTER.format(pager=pager, sidebar=sidebar))
+
+
+def synthetic_records(rows: int, seed: int = 42):
+    """生成 rows 条确定性的合成条目，放送日期分布在 1960 年至今，用于大规模合并/渲染基准"""
+    from pull import AnimeRecord
+
+    rng = random.Random(seed)
+    records = []
+    for i in range(rows):
+        subject_id = 1000 + i
+        year = rng.randint(1960, 2026)
+        month = rng.randint(0, 12)
+        records.append(AnimeRecord(
+            subject_id=subject_id,
+            title=rng.choice(TITLES) + f' {subject_id}',
+            jp_title='' if rng.random() < 0.15 else rng.choice(JP_TITLES),
+            cover='' if rng.random() < 0.1 else f'https://lain.bgm.tv/r/400/pic/cover/l/{subject_id % 97:02x}/{subject_id}_c.jpg',
+            year=year, month=month, day=rng.randint(1, 28) if month and rng.random() < 0.7 else 0,
+            episodes=None if rng.random() < 0.2 else rng.choice([1, 2, 6, 12, 13, 24, 26, 52]),
+            score=None if rng.random() < 0.3 else rng.randint(30, 95) / 10,
+            votes=rng.randint(0, 90000)))
+    return records
+
+
+def write_markdown_fixture(path: str, rows: int, seed: int = 42):
+    """生成合成的单文件 Bangumi_Anime.md（经由正式的存储和渲染流程）"""
+    import tempfile
+    from pull import AnimeStore, BangumiScraper
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scraper = BangumiScraper()
+        scraper.store = AnimeStore(os.path.join(tmp, 'bench.db'))
+        scraper.store.upsert(synthetic_records(rows, seed))
+        scraper.write_markdown(path)
+        scraper.store.close()
+    print(f'已生成 {rows} 行的合成报告: {path}')
+
+
+def write_fixtures(out_dir: str, seed: int = 42):
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    specs = [(2024, 4, 4), (2023, 10, 3), (2016, 1, 2), (2009, 7, 1), (1998, 4, 2)]
+    written = 0
+    for year, month, total_pages in specs:
+        for page in range(1, total_pages + 1):
+            count = ITEMS_PER_PAGE if page < total_pages else rng.randint(1, ITEMS_PER_PAGE)
+            path = os.path.join(out_dir, f'{year}-{month:02d}_p{page}.html')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(render_page(rng, year, month, page, total_pages, count))
+            written += 1
+    print(f'已生成 {written} 个样本页面: {out_dir}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate listing page fixtures')
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(__file__), 'fixtures', 'listing'))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--markdown', metavar='PATH', help='Also write a synthetic single-file report to PATH')
+    parser.add_argument('--rows', type=int, default=50000, help='Rows in the synthetic report')
+    args = parser.parse_args()
+    write_fixtures(args.out, args.seed)
+    if args.markdown:
+        write_markdown_fixture(args.markdown, args.rows, args.seed)
@@ -1,14 +1,37 @@
 import argparse
 import asyncio
+import bisect
+import hashlib
+import importlib.util
+import io
+import itertools
+import json
 import logging
+import multiprocessing
 import os
+import random
 import re
+import shutil
+import signal
+import socket
+import sqlite3
+import sys
+import tempfile
 import time
-from collections import defaultdict
-from typing import Dict, List, Tuple
+import unicodedata
+from collections import deque
+from contextlib import contextmanager, nullcontext, suppress
+from dataclasses import asdict, dataclass, field, fields, replace
+from operator import attrgetter
+from email.utils import parsedate_to_datetime
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
 
 import aiohttp
 from bs4 import BeautifulSoup
+from lxml import etree
+from lxml import html as lxml_html
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
@@ -24,6 +47,7 @@ EPS_PATTERN = re.compile(r'(\d+)话')
 FULL_DATE_PATTERN = re.compile(r'(\d{4})年(\d{1,2})月(\d{1,2})日')
 YEAR_MONTH_PATTERN = re.compile(r'(\d{4})年(\d{1,2})月')
 YEAR_PATTERN = re.compile(r'(\d{4})年')
+DIRECT_YEAR_PATTERN = re.compile(r'\b(\d{4})\b')
 # 新增的正则表达式，用于匹配格式化的日期
 FORMATTED_DATE_PATTERN = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})(?:\(.*?\))?')
 FORMATTED_YEAR_MONTH_PATTERN = re.compile(r'(\d{4})-(\d{1,2})(?:\(.*?\))?')
@@ -32,84 +56,2198 @@ FORMATTED_YEAR_MONTH_PATTERN = re.compile(r'(\d{4})-(\d{1,2})(?:\(.*?\))?')
 DEFAULT_CONCURRENT = 3
 MAX_CONCURRENT = int(os.environ.get('CONCURRENT_REQUESTS', DEFAULT_CONCURRENT))
 
+# 连接池配置：空闲连接保持时间（秒）和 DNS 解析缓存时间（秒）
+DEFAULT_KEEPALIVE_TIMEOUT = 30.0
+DEFAULT_DNS_CACHE_TTL = 300
+# 封面下载的默认并发数
+DEFAULT_COVER_CONCURRENCY = 4
+
+# 请求重试与限速配置
+DEFAULT_RATE_LIMIT = 4.0  # 每个主机每秒请求数
+DEFAULT_MAX_RETRIES = 4
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+REQUEST_TIMEOUT = 20
+# 运行结束前重新尝试失败任务的轮数
+FAILED_RETRY_ROUNDS = 1
+
+# 站点地址，可通过环境变量指向本地回放/基准测试服务器
+BASE_URL = os.environ.get('BANGUMI_BASE_URL', "https://bangumi.tv").rstrip('/')
+
+# 数据存储配置
+DEFAULT_OUTPUT_FILE = "Bangumi_Anime.md"
+# 输出模式：single 生成单个报告文件；sharded 按年份分片，另生成目录索引，只重写内容变化的分片
+OUTPUT_MODES = ('single', 'sharded')
+DEFAULT_OUTPUT_MODE = 'sharded'
+DEFAULT_SHARD_DIR = "Bangumi_Anime"
+SHARD_INDEX_FILE = "README.md"
+SHARD_FILE_PATTERN = re.compile(r'(\d+)\.md')
+DEFAULT_DB_FILE = os.path.join("data", "bangumi.db")
+SUBJECT_ID_PATTERN = re.compile(r'/subject/(\d+)')
+# 表格单元格以 | 结尾；\| 是转义的竖线，[标题](链接) 整体属于一个单元格（兼容旧报告中未转义的标题）
+MARKDOWN_CELL_PATTERN = re.compile(r'((?:\\\||!?\[[^\]]*\]\([^)]*\)|[^|])*)\|')
+MARKDOWN_TABLE_HEADER = "| 放送日期 | 封面 | 中文标题 | 日文标题 | 话数 | 评分 | 评分人数 |\n" \
+                        "| --- | --- | --- | --- | --- | --- | --- |\n"
+WRITE_BUFFER_SIZE = 1024 * 1024
+# 标题检索：中日文标题按规范化后的 N 字片段建立倒排索引
+TITLE_NGRAM = 2
+WHITESPACE_PATTERN = re.compile(r'\s+')
+QUERY_ORDERS = {
+    'date': 'year DESC, month DESC, day DESC, subject_id',
+    'score': 'score IS NULL, score DESC, votes DESC',
+    'votes': 'votes DESC, subject_id',
+}
+DEFAULT_QUERY_LIMIT = 50
+
+# 列式导出配置：按年份分区，增量追加 updated_at 晚于上次导出水位线的条目（pandas 延迟导入）
+DEFAULT_EXPORT_DIR = os.path.join("data", "export")
+EXPORT_FORMATS = ('parquet', 'csv')
+# 存储读入 DataFrame 时各列的类型（导出和统计共用）
+COLUMN_DTYPES = {
+    'subject_id': 'int64',
+    'year': 'int16',
+    'month': 'int8',
+    'day': 'int8',
+    'episodes': 'Int32',
+    'score': 'Float32',
+    'votes': 'int32',
+    'rank': 'Int32',
+    'title': 'string',
+    'jp_title': 'string',
+    'cover': 'string',
+    'studio': 'string',
+    'air_date': 'string',
+    'tags': 'string',
+    'updated_at': 'float64',
+}
+
+# 统计报告配置：全量数据向量化计算，与上次运行的统计结果对比
+DEFAULT_STATS_FILE = "Bangumi_Stats.md"
+DEFAULT_STATS_JSON = os.path.join("data", "stats.json")
+DEFAULT_STATS_TOP = 20
+STATS_RECENT_YEARS = 10
+STATS_COLUMNS = ('subject_id', 'year', 'month', 'score', 'votes')  # 标题只为排行中的条目单独读取
+SEASONS = ('冬', '春', '夏', '秋')  # 1-3 / 4-6 / 7-9 / 10-12 月
+
+# 评分历史配置：每个条目的 (时间, 评分, 评分人数) 只在数值变化时记录，按条目以差值变长编码存放
+HISTORY_TIME_UNIT = 60  # 观测时间精度（秒）
+HISTORY_SCORE_SCALE = 100  # 评分按整数存储（评分 × 100），无评分记为 -1
+
+# 封面镜像配置：原图按内容哈希存放（跨 URL、跨运行去重），报告引用的缩略图需要可选依赖 Pillow
+DEFAULT_COVER_DIR = os.path.join("data", "covers")
+DEFAULT_THUMB_DIR = "covers"
+COVER_THUMB_SIZE = (96, 136)
+COVER_THUMB_QUALITY = 80
+COVER_CHECKPOINT_SIZE = 200
+COVER_SIGNATURES = ((b'\xff\xd8\xff', '.jpg'), (b'\x89PNG', '.png'), (b'GIF8', '.gif'), (b'RIFF', '.webp'))
+
+# 分布式爬取配置：协调者与工作进程通过共享 spool 目录中的分片队列（SQLite）和分片结果文件协作
+DEFAULT_SPOOL_DIR = os.path.join("data", "spool")
+DEFAULT_LOCAL_WORKERS = 2
+SHARD_LEASE_SECONDS = 600
+SHARD_MAX_ATTEMPTS = 3
+SHARD_POLL_INTERVAL = 2.0
+
+# 常驻更新配置：按放送时间分层的刷新间隔（秒），在层内随观测到的变化自适应
+DEFAULT_REQUEST_BUDGET = 600  # 常驻模式每小时请求数上限
+DEFAULT_DAEMON_SINCE_YEAR = 2000
+DEFAULT_PUBLISH_INTERVAL = 3600.0
+DAEMON_AIRING_MONTHS = 3  # 当前月份及之前 2 个月视为放送中
+DAEMON_MONTHLY_YEARS = 2  # 今年和去年按月刷新，更早的年份按年刷新
+REFRESH_TIERS = {  # 层级: (初始间隔, 最短间隔, 最长间隔)
+    'airing': (6 * 3600, 2 * 3600, 24 * 3600),
+    'recent': (3 * 86400, 86400, 14 * 86400),
+    'archive': (30 * 86400, 7 * 86400, 90 * 86400),
+}
+REFRESH_SPEEDUP = 0.5  # 有变化时间隔乘以该系数
+REFRESH_SLOWDOWN = 1.5  # 无变化时间隔乘以该系数
+DAEMON_MAX_SLEEP = 300.0  # 空闲时单次休眠上限，跨月后及时加入新的单元
+
+# HTTP缓存配置
+DEFAULT_CACHE_DIR = os.path.join("data", "http_cache")
+DEFAULT_CACHE_MAX_MB = 512
+# 按放送年份距今的年数设置缓存有效期（秒），inf 表示永不重新验证
+DEFAULT_CACHE_TTL = "0:3600,1:86400,3:604800,10:inf"
+# 详情页使用独立的缓存目录和大小上限，不与列表页争用空间；详情页只在补全到期时请求，
+# 因此缓存的页面每次都用条件请求重新验证
+DEFAULT_DETAIL_CACHE_DIR = os.path.join("data", "subject_cache")
+DEFAULT_DETAIL_CACHE_MAX_MB = 256
+DETAIL_CACHE_TTL = "0:0"
+
+# 列表页解析后端：bs4 构建完整文档树；lxml 只截取并解析条目列表和分页栏片段
+PARSER_BACKENDS = ('bs4', 'lxml')
+DEFAULT_PARSER = 'bs4'
+ITEM_LIST_MARKER = re.compile(rb'id\s*=\s*["\']browserItemList["\']')
+TAG_NAME_PATTERN = re.compile(rb'<([a-zA-Z0-9]+)')
+PAGINATION_MARKER = re.compile(rb'class\s*=\s*["\'][^"\']*\bpage_inner\b')
+# 列表页指纹的版本号，解析逻辑变化时递增，使旧指纹全部失效
+FINGERPRINT_VERSION = b'1'
+
+# 解析执行器：process 利用多核并行解析，thread 仅释放事件循环，inline 在事件循环中直接解析
+PARSE_EXECUTORS = ('process', 'thread', 'inline')
+DEFAULT_PARSE_EXECUTOR = 'process'
+
+# 条目详情补全配置：补全从未补全或超过有效期的条目，使用独立于列表页爬取的并发预算
+DEFAULT_ENRICH_CONCURRENCY = 2
+DEFAULT_ENRICH_TTL_DAYS = 30
+# 每补全多少个条目写入一次检查点，中断后已写入的条目不会重新获取
+ENRICH_CHECKPOINT_SIZE = 50
+SUBJECT_AIR_DATE_KEYS = ('放送开始', '上映年度', '发售日', '开始')
+SUBJECT_STUDIO_KEYS = ('动画制作', '制作')
+RANK_PATTERN = re.compile(r'#\s*(\d+)')
+
+# 运行指标：耗时直方图的桶上界（秒）及 Prometheus 指标名前缀
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRICS_PREFIX = 'bangumi_'
+
+# 工作队列优先级：页面任务优先于探测任务，保证结果尽早流出、队列不会无限堆积
+PRIORITY_PAGE = 0
+PRIORITY_PROBE = 1
+
+
+@contextmanager
+def atomic_write(path: str, encoding: str = 'utf-8'):
+    """写入同目录下的临时文件，成功后原子替换目标文件；中途出错时目标文件保持不变"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+    try:
+        with open(fd, 'w', encoding=encoding, newline='', buffering=WRITE_BUFFER_SIZE) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_if_changed(path: str, content: str) -> bool:
+    """内容哈希与现有文件不同时才原子写入，返回是否写入"""
+    data = content.encode('utf-8')
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            if hashlib.sha256(f.read()).digest() == hashlib.sha256(data).digest():
+                return False
+    with atomic_write(path) as f:
+        f.write(content)
+    return True
+
+
+def escape_markdown_cell(text: str) -> str:
+    """转义表格单元格中的竖线，避免标题中的 | 被当作列分隔符"""
+    return (text or '').replace('|', '\\|')
+
+
+def split_markdown_row(line: str) -> List[str]:
+    """拆分表格行，返回去除首尾空白并还原转义竖线的单元格"""
+    line = line.strip()
+    if not line.startswith('|'):
+        return []
+    return [cell.strip().replace('\\|', '|') for cell in MARKDOWN_CELL_PATTERN.findall(line[1:])]
+
+
+def _has_class(name: str) -> str:
+    """生成按 class 精确匹配的 XPath 条件（等价于 CSS 的 .name）"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# lxml 后端的预编译 XPath，语义与 bs4 后端的 CSS 选择器一一对应
+XPATH_ITEMS = etree.XPath(f"li[{_has_class('item')}]")
+XPATH_TITLE = etree.XPath(f"(.//h3/a[{_has_class('l')}])[1]")
+XPATH_JP_TITLE = etree.XPath(f"following-sibling::small[{_has_class('grey')}][1]")
+XPATH_COVER = etree.XPath(f"(.//a[{_has_class('subjectCover')}]//img[{_has_class('cover')}])[1]")
+XPATH_INFO = etree.XPath(f"(.//p[{_has_class('info')} and {_has_class('tip')}])[1]")
+XPATH_RATE = etree.XPath(f"(.//p[{_has_class('rateInfo')}])[1]")
+XPATH_SCORE = etree.XPath(f"(.//span[{_has_class('number')}])[1]")
+XPATH_VOTES = etree.XPath(f"(.//span[{_has_class('tip_j')}])[1]")
+XPATH_PAGE_LINKS = etree.XPath(f".//a[{_has_class('p')}]")
+# 条目详情页
+XPATH_INFOBOX_ITEMS = etree.XPath("//ul[@id='infobox']/li")
+XPATH_SUBJECT_TAGS = etree.XPath(f"//div[{_has_class('subject_tag_section')}]//a[{_has_class('l')}]/span/text()")
+XPATH_SUBJECT_RANK = etree.XPath(f"//div[{_has_class('global_score')}]//small[{_has_class('alarm')}]/text()")
+
+
+def extract_element(body: bytes, marker: re.Pattern) -> Optional[bytes]:
+    """截取包含标记属性的完整元素源码（处理同名标签嵌套），找不到时返回 None"""
+    found = marker.search(body)
+    if not found:
+        return None
+    start = body.rfind(b'<', 0, found.start())
+    if start < 0 or not (tag := TAG_NAME_PATTERN.match(body, start)):
+        return None
+
+    depth = 0
+    tag_pattern = re.compile(rb'<(/?)' + re.escape(tag.group(1)) + rb'[\s>]', re.IGNORECASE)
+    for m in tag_pattern.finditer(body, start):
+        depth += -1 if m.group(1) else 1
+        if depth == 0:
+            return body[start:body.find(b'>', m.start()) + 1]
+    return body[start:]
+
+
+def page_fingerprint(body: bytes) -> str:
+    """列表页指纹：条目列表（#browserItemList）和分页栏片段的哈希，与页面其余部分的变化无关；
+    找不到条目列表时对整个页面取哈希"""
+    items = extract_element(body, ITEM_LIST_MARKER)
+    digest = hashlib.sha1(FINGERPRINT_VERSION)
+    digest.update(body if items is None else items)
+    digest.update(extract_element(body, PAGINATION_MARKER) or b'')
+    return digest.hexdigest()
+
+
+def _first(results: list):
+    return results[0] if results else None
+
+
+@dataclass(slots=True)
+class AnimeRecord:
+    """番剧条目，数值字段在解析时一次性规范化"""
+    subject_id: int
+    title: str = ''
+    jp_title: str = ''
+    cover: str = ''
+    year: int = 0
+    month: int = 0
+    day: int = 0
+    episodes: Optional[int] = None
+    score: Optional[float] = None
+    votes: int = 0
+
+    @property
+    def url(self) -> str:
+        return f"https://bangumi.tv/subject/{self.subject_id}"
+
+    @property
+    def date_label(self) -> str:
+        """报告中的放送日期：YYYY、YYYY-MM 或 YYYY-MM-DD，年份未知时为“未知”"""
+        if not self.year:
+            return "未知"
+        if self.month <= 0:
+            return f"{self.year}"
+        if self.day <= 0:
+            return f"{self.year}-{self.month:02d}"
+        return f"{self.year}-{self.month:02d}-{self.day:02d}"
+
+    @staticmethod
+    def parse_subject_id(url: str) -> Optional[int]:
+        match = SUBJECT_ID_PATTERN.search(url or '')
+        return int(match.group(1)) if match else None
+
+    @staticmethod
+    def parse_score(text: str) -> Optional[float]:
+        try:
+            return float(text)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def parse_votes(text: str) -> int:
+        digits = re.sub(r'\D', '', text or '')
+        return int(digits) if digits else 0
+
+    @staticmethod
+    def parse_episodes(text: str) -> Optional[int]:
+        text = (text or '').strip()
+        return int(text) if text.isdigit() else None
+
+    def as_row(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> 'AnimeRecord':
+        return cls(**{name: row[name] for name in RECORD_FIELDS})
+
+
+RECORD_FIELDS = tuple(f.name for f in fields(AnimeRecord))
+
+
+@dataclass(slots=True)
+class SubjectDetail:
+    """条目详情页补全的字段，air_date 为 YYYY-MM-DD（信息不全时为 YYYY-MM 或 YYYY）"""
+    subject_id: int
+    studio: str = ''
+    tags: List[str] = field(default_factory=list)
+    air_date: str = ''
+    rank: Optional[int] = None
+
+    @staticmethod
+    def parse_air_date(text: str) -> str:
+        if match := FORMATTED_DATE_PATTERN.search(text) or FULL_DATE_PATTERN.search(text):
+            return '{:04d}-{:02d}-{:02d}'.format(*map(int, match.group(1, 2, 3)))
+        if match := FORMATTED_YEAR_MONTH_PATTERN.search(text) or YEAR_MONTH_PATTERN.search(text):
+            return '{:04d}-{:02d}'.format(*map(int, match.group(1, 2)))
+        if match := YEAR_PATTERN.search(text) or DIRECT_YEAR_PATTERN.search(text):
+            return match.group(1)
+        return ''
+
+    def as_row(self) -> Dict:
+        row = asdict(self)
+        row['tags'] = json.dumps(self.tags, ensure_ascii=False)
+        return row
+
+
+def normalize_title(text: str) -> str:
+    """标题检索用的规范化：全角转半角、统一大小写并去除空白"""
+    return WHITESPACE_PATTERN.sub('', unicodedata.normalize('NFKC', text or '').casefold())
+
+
+def title_ngrams(*titles: str) -> set:
+    """标题规范化后的全部 N 字片段"""
+    grams = set()
+    for title in titles:
+        text = normalize_title(title)
+        grams.update(text[i:i + TITLE_NGRAM] for i in range(len(text) - TITLE_NGRAM + 1))
+    return grams
+
+
+def migrate_title_index(conn: sqlite3.Connection):
+    """建立标题 N 字片段倒排索引及检索用的数值索引，并为已有条目建立索引"""
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS title_ngram (
+            gram TEXT NOT NULL,
+            subject_id INTEGER NOT NULL,
+            PRIMARY KEY (gram, subject_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_title_ngram_subject ON title_ngram (subject_id);
+        CREATE INDEX IF NOT EXISTS idx_anime_score ON anime (score);
+        CREATE INDEX IF NOT EXISTS idx_anime_votes ON anime (votes);
+    """)
+    conn.executemany('INSERT OR IGNORE INTO title_ngram (gram, subject_id) VALUES (?, ?)',
+                     ((gram, row[0]) for row in conn.execute('SELECT subject_id, title, jp_title FROM anime').fetchall()
+                      for gram in title_ngrams(row[1], row[2])))
+
+
+def encode_deltas(points: Iterable[Tuple[int, ...]], previous: Tuple[int, ...] = (0, 0, 0)) -> bytes:
+    """将整数三元组序列编码为相对前一点的差值（zigzag 变长整数），previous 为序列之前的最后一点"""
+    out = bytearray()
+    for point in points:
+        for value, before in zip(point, previous):
+            delta = value - before
+            delta = delta << 1 if delta >= 0 else (~delta << 1) | 1
+            while delta >= 0x80:
+                out.append(delta & 0x7f | 0x80)
+                delta >>= 7
+            out.append(delta)
+        previous = point
+    return bytes(out)
+
+
+def decode_deltas(blob: bytes) -> List[Tuple[int, int, int]]:
+    """encode_deltas 的逆过程，返回还原后的整数三元组"""
+    points, current, deltas = [], (0, 0, 0), []
+    value = shift = 0
+    for byte in blob:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        deltas.append((value >> 1) ^ -(value & 1))
+        value = shift = 0
+        if len(deltas) == 3:
+            current = tuple(c + d for c, d in zip(current, deltas))
+            points.append(current)
+            deltas = []
+    return points
+
+
+def history_point(at: float, score: Optional[float], votes: int) -> Tuple[int, int, int]:
+    """评分观测转换为存储用的整数三元组 (时间单位数, 评分 × 100 或 -1, 评分人数)"""
+    return (int(at // HISTORY_TIME_UNIT),
+            -1 if score is None else round(score * HISTORY_SCORE_SCALE),
+            votes or 0)
+
+
+def migrate_score_history(conn: sqlite3.Connection):
+    """建立评分历史表，以已有条目的当前评分（时间取 updated_at）作为第一个观测点"""
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS score_history (
+            subject_id INTEGER PRIMARY KEY,
+            points INTEGER NOT NULL,
+            last_at INTEGER NOT NULL,
+            last_score INTEGER NOT NULL,
+            last_votes INTEGER NOT NULL,
+            deltas BLOB NOT NULL
+        );
+    """)
+    rows = []
+    for subject_id, score, votes, updated_at in conn.execute(
+            'SELECT subject_id, score, votes, updated_at FROM anime').fetchall():
+        point = history_point(updated_at, score, votes)
+        rows.append((subject_id, 1, *point, encode_deltas([point])))
+    conn.executemany('INSERT OR IGNORE INTO score_history VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+
+@dataclass
+class MergeResult:
+    """一次合并的结果：新增与更新的条目，以及内容未变化的条目数"""
+    inserted: List[AnimeRecord] = field(default_factory=list)
+    updated: List[AnimeRecord] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def changed(self) -> int:
+        return len(self.inserted) + len(self.updated)
+
+
+@dataclass(slots=True)
+class CrawledPage:
+    """一个成功爬取的列表页；total_pages 只在第一页（探测任务）上已知
+
+    指纹与上次合并时相同的页面不解析，items 为空，skipped_items 为上次合并的条目数。
+    """
+    year: int
+    month: Optional[int]
+    page: int
+    items: List[AnimeRecord]
+    total_pages: Optional[int] = None
+    fingerprint: Optional[str] = None
+    skipped_items: Optional[int] = None
+
+    @property
+    def unchanged(self) -> bool:
+        return self.skipped_items is not None
+
+
+@dataclass(slots=True)
+class ScorePoint:
+    """评分历史中的一个观测点：从该时间起的评分和评分人数"""
+    at: float
+    score: Optional[float]
+    votes: int
+
+    @classmethod
+    def from_point(cls, point: Tuple[int, int, int]) -> 'ScorePoint':
+        at, score, votes = point
+        return cls(at * HISTORY_TIME_UNIT, None if score < 0 else score / HISTORY_SCORE_SCALE, votes)
+
+    def as_row(self) -> Dict:
+        return {'at': self.at, 'score': self.score, 'votes': self.votes}
+
+
+class MergeEngine:
+    """以条目ID为键的合并引擎
+
+    索引在合并前构建一次，每个新条目只做一次字典查找，合并耗时与新批次大小成正比。
+    同一条目多次出现时后写入者生效：评分、评分人数、集数等字段整体覆盖。
+    """
+
+    def __init__(self, index: Optional[Dict[int, AnimeRecord]] = None):
+        self.index: Dict[int, AnimeRecord] = index if index is not None else {}
+
+    def merge(self, batch: Iterable[AnimeRecord]) -> MergeResult:
+        status: Dict[int, str] = {}
+        for record in batch:
+            subject_id = record.subject_id
+            current = self.index.get(subject_id)
+            if current is None:
+                status[subject_id] = 'inserted'
+            elif current != record and status.get(subject_id) != 'inserted':
+                status[subject_id] = 'updated'
+            else:
+                status.setdefault(subject_id, 'unchanged')
+            self.index[subject_id] = record
+
+        result = MergeResult()
+        for subject_id, state in status.items():
+            if state == 'unchanged':
+                result.unchanged += 1
+            else:
+                getattr(result, state).append(self.index[subject_id])
+        return result
+
+
+class AnimeStore:
+    """番剧数据存储（SQLite，以 Bangumi 条目ID 为主键）
+
+    爬取结果以 upsert 方式写入，仅改动发生变化的行；Markdown 报告由存储派生生成。
+    """
+
+    # 按顺序执行的结构迁移，版本号记录在 PRAGMA user_version 中
+    MIGRATIONS = [
+        """
+        CREATE TABLE anime (
+            subject_id INTEGER PRIMARY KEY,
+            year INTEGER NOT NULL DEFAULT 0,
+            month INTEGER NOT NULL DEFAULT 0,
+            day INTEGER NOT NULL DEFAULT 0,
+            cover TEXT NOT NULL DEFAULT '',
+            title TEXT NOT NULL DEFAULT '',
+            jp_title TEXT NOT NULL DEFAULT '',
+            episodes INTEGER,
+            score REAL,
+            votes INTEGER NOT NULL DEFAULT 0,
+            seq INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX idx_anime_date ON anime (year, month, day);
+        """,
+        """
+        ALTER TABLE anime ADD COLUMN studio TEXT;
+        ALTER TABLE anime ADD COLUMN tags TEXT;
+        ALTER TABLE anime ADD COLUMN air_date TEXT;
+        ALTER TABLE anime ADD COLUMN rank INTEGER;
+        ALTER TABLE anime ADD COLUMN enriched_at REAL;
+        CREATE INDEX idx_anime_enriched ON anime (enriched_at);
+        """,
+        """
+        CREATE TABLE crawl_manifest (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            page INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            total_pages INTEGER,
+            items INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (year, month, page)
+        );
+        """,
+        migrate_title_index,
+        """
+        CREATE TABLE cover_mirror (
+            url TEXT PRIMARY KEY,
+            digest TEXT,
+            thumb TEXT,
+            size INTEGER NOT NULL DEFAULT 0,
+            fetched_at REAL NOT NULL
+        );
+        CREATE INDEX idx_cover_digest ON cover_mirror (digest);
+        """,
+        """
+        CREATE TABLE page_fingerprint (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            page INTEGER NOT NULL,
+            digest TEXT NOT NULL,
+            total_pages INTEGER,
+            items INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (year, month, page)
+        );
+        """,
+        migrate_score_history,
+        """
+        CREATE TABLE refresh_schedule (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            interval REAL NOT NULL,
+            last_at REAL NOT NULL,
+            pages INTEGER NOT NULL DEFAULT 1,
+            changed INTEGER NOT NULL DEFAULT 0,
+            crawls INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (year, month)
+        );
+        """,
+        """
+        CREATE TABLE request_log (
+            sent_at REAL NOT NULL
+        );
+        CREATE INDEX idx_request_log_sent ON request_log (sent_at);
+        """,
+    ]
+
+    FIELDS = ('year', 'month', 'day', 'cover', 'title', 'jp_title', 'episodes', 'score', 'votes')
+    DETAIL_FIELDS = ('studio', 'tags', 'air_date', 'rank')
+
+    def __init__(self, path: str = DEFAULT_DB_FILE):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.create_function('normalize_title', 1, normalize_title, deterministic=True)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._migrate()
+        self.next_seq = self.conn.execute('SELECT COALESCE(MAX(seq), 0) + 1 FROM anime').fetchone()[0]
+        self.history_appended = 0
+
+    def _migrate(self):
+        """执行未应用的结构迁移"""
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, script in enumerate(self.MIGRATIONS[version:], start=version + 1):
+            with self.conn:
+                if callable(script):
+                    script(self.conn)
+                else:
+                    self.conn.executescript(script)
+                self.conn.execute(f'PRAGMA user_version = {number}')
+
+    def close(self):
+        self.conn.close()
+
+    def count(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM anime').fetchone()[0]
+
+    def fetch(self, subject_ids: Iterable[int]) -> Dict[int, AnimeRecord]:
+        """按条目ID批量读取已有条目，用作合并索引"""
+        ids = list(subject_ids)
+        index = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            for row in self.conn.execute(
+                    f"SELECT * FROM anime WHERE subject_id IN ({','.join('?' * len(chunk))})", chunk):
+                index[row['subject_id']] = AnimeRecord.from_row(row)
+        return index
+
+    def upsert(self, records: Iterable[AnimeRecord]) -> MergeResult:
+        """写入一批条目；只预取本批条目ID对应的行作为索引，未变化的行不会被改写"""
+        batch = list(records)
+        index = self.fetch({record.subject_id for record in batch})
+        # 合并会原地修改索引中的条目，先记下入库前的标题，用于判断倒排索引是否需要重建
+        titles = {subject_id: (record.title, record.jp_title) for subject_id, record in index.items()}
+        result = MergeEngine(index).merge(batch)
+        if not result.changed:
+            return result
+
+        now = time.time()
+        inserted = []
+        for record in result.inserted:
+            row = record.as_row()
+            row['seq'] = self.next_seq
+            row['updated_at'] = now
+            self.next_seq += 1
+            inserted.append(row)
+        updated = [dict(record.as_row(), updated_at=now) for record in result.updated]
+
+        columns = ('subject_id',) + self.FIELDS + ('seq', 'updated_at')
+        assignments = ', '.join(f"{f} = :{f}" for f in self.FIELDS + ('updated_at',))
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO anime ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})",
+                inserted)
+            self.conn.executemany(
+                f"UPDATE anime SET {assignments} WHERE subject_id = :subject_id", updated)
+            self._index_titles([record for record in result.inserted + result.updated
+                                if titles.get(record.subject_id) != (record.title, record.jp_title)])
+            self._append_history(result.inserted + result.updated, now)
+        return result
+
+    def _append_history(self, records: List[AnimeRecord], now: float):
+        """评分或评分人数与历史中最后一点不同的条目追加一个观测点；只追加差值字节，不解码已有历史"""
+        last = {}
+        ids = [record.subject_id for record in records]
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            for row in self.conn.execute(
+                    f"SELECT subject_id, last_at, last_score, last_votes FROM score_history "
+                    f"WHERE subject_id IN ({','.join('?' * len(chunk))})", chunk):
+                last[row[0]] = tuple(row)[1:]
+
+        created, appended = [], []
+        for record in records:
+            point = history_point(now, record.score, record.votes)
+            before = last.get(record.subject_id)
+            if before is None:
+                created.append((record.subject_id, *point, encode_deltas([point])))
+            elif before[1:] != point[1:]:
+                appended.append((encode_deltas([point], before), *point, record.subject_id))
+        self.conn.executemany(
+            'INSERT INTO score_history (subject_id, points, last_at, last_score, last_votes, deltas) '
+            'VALUES (?, 1, ?, ?, ?, ?)', created)
+        self.conn.executemany(
+            'UPDATE score_history SET deltas = CAST(deltas || ? AS BLOB), points = points + 1, '
+            'last_at = ?, last_score = ?, last_votes = ? WHERE subject_id = ?', appended)
+        self.history_appended += len(created) + len(appended)
+
+    def history(self, subject_ids: Iterable[int]) -> Dict[int, List[ScorePoint]]:
+        """读取条目的评分历史（按时间顺序），没有历史的条目不出现在结果中"""
+        ids = list(subject_ids)
+        histories = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            for subject_id, deltas in self.conn.execute(
+                    f"SELECT subject_id, deltas FROM score_history WHERE subject_id IN ({','.join('?' * len(chunk))})",
+                    chunk):
+                histories[subject_id] = [ScorePoint.from_point(point) for point in decode_deltas(deltas)]
+        return histories
+
+    def season_history(self, year: int, season: int = None) -> Dict[int, List[ScorePoint]]:
+        """读取某年（season 为 0-3 时为该季度，见 SEASONS）放送条目的评分历史"""
+        sql, params = 'SELECT subject_id FROM anime WHERE year = ?', [year]
+        if season is not None:
+            sql += ' AND month BETWEEN ? AND ?'
+            params.extend((season * 3 + 1, season * 3 + 3))
+        return self.history(row[0] for row in self.conn.execute(sql, params))
+
+    def history_size(self) -> Tuple[int, int, int]:
+        """评分历史规模：(条目数, 观测点数, 差值编码字节数)"""
+        row = self.conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(points), 0), COALESCE(SUM(length(deltas)), 0) FROM score_history').fetchone()
+        return tuple(row)
+
+    def _index_titles(self, records: List[AnimeRecord]):
+        """重建这些条目的标题倒排索引，调用方只传入新增或标题有变化的条目"""
+        self.conn.executemany('DELETE FROM title_ngram WHERE subject_id = ?', [(r.subject_id,) for r in records])
+        self.conn.executemany('INSERT OR IGNORE INTO title_ngram (gram, subject_id) VALUES (?, ?)',
+                              [(gram, r.subject_id) for r in records for gram in title_ngrams(r.title, r.jp_title)])
+
+    def query(self, years: Tuple[int, int] = None, months: Tuple[int, int] = None, min_score: float = None,
+              min_votes: int = None, title: str = None, order: str = 'date',
+              limit: int = DEFAULT_QUERY_LIMIT) -> List[AnimeRecord]:
+        """按放送年月范围、评分、评分人数和标题子串（中文或日文）检索条目
+
+        标题先用 N 字片段倒排索引求交集缩小候选，再在规范化后的标题上精确匹配子串。
+        """
+        clauses, params = [], []
+        if years:
+            clauses.append('year BETWEEN ? AND ?')
+            params.extend(years)
+        if months:
+            clauses.append('month BETWEEN ? AND ?')
+            params.extend(months)
+        if min_score is not None:
+            clauses.append('score >= ?')
+            params.append(min_score)
+        if min_votes is not None:
+            clauses.append('votes >= ?')
+            params.append(min_votes)
+        if title and (needle := normalize_title(title)):
+            for gram in sorted(title_ngrams(title)):
+                clauses.append('subject_id IN (SELECT subject_id FROM title_ngram WHERE gram = ?)')
+                params.append(gram)
+            clauses.append('(instr(normalize_title(title), ?) > 0 OR instr(normalize_title(jp_title), ?) > 0)')
+            params.extend((needle, needle))
+
+        sql = 'SELECT * FROM anime'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += f' ORDER BY {QUERY_ORDERS[order]}'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [AnimeRecord.from_row(row) for row in self.conn.execute(sql, params)]
+
+    def pending_enrichment(self, max_age: float, limit: int = None) -> List[Tuple[int, int]]:
+        """返回需要补全详情的 (条目ID, 年份)：从未补全的优先，其次是补全时间最早且超过 max_age 秒的"""
+        query = ('SELECT subject_id, year FROM anime WHERE enriched_at IS NULL OR enriched_at < ? '
+                 'ORDER BY enriched_at IS NOT NULL, enriched_at, year DESC, subject_id')
+        params = [time.time() - max_age]
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        return [(row[0], row[1]) for row in self.conn.execute(query, params)]
+
+    def save_details(self, details: List[SubjectDetail]):
+        """写入一批详情补全结果并记录补全时间，作为可恢复的检查点；详情有变化时同时更新 updated_at"""
+        if not details:
+            return
+        now = time.time()
+        assignments = ', '.join(f"{f} = :{f}" for f in self.DETAIL_FIELDS)
+        changed = ' OR '.join(f"{f} IS NOT :{f}" for f in self.DETAIL_FIELDS)
+        with self.conn:
+            self.conn.executemany(
+                f"UPDATE anime SET {assignments}, enriched_at = :now, "
+                f"updated_at = CASE WHEN {changed} THEN :now ELSE updated_at END "
+                f"WHERE subject_id = :subject_id",
+                [dict(detail.as_row(), now=now) for detail in details])
+
+    def completed_pages(self, year: int, month: int = None) -> Tuple[Optional[int], set]:
+        """读取爬取清单，返回 (总页数, 已完成页码集合)；总页数来自已完成的第一页"""
+        total_pages, done = None, set()
+        for row in self.conn.execute(
+                "SELECT page, total_pages FROM crawl_manifest WHERE year = ? AND month = ? AND status = 'done'",
+                (year, month or 0)):
+            done.add(row['page'])
+            if row['page'] == 1:
+                total_pages = row['total_pages']
+        return total_pages, done
+
+    def mark_page(self, year: int, month: Optional[int], page: int, status: str,
+                  total_pages: int = None, items: int = 0):
+        """记录列表页的爬取状态（done / failed）"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO crawl_manifest (year, month, page, status, total_pages, items, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (year, month or 0, page, status, total_pages, items, time.time()))
+
+    def reset_manifest(self, year: int, month: int = None):
+        """清除 (年份, 月份) 的爬取清单，从头开始爬取"""
+        with self.conn:
+            self.conn.execute('DELETE FROM crawl_manifest WHERE year = ? AND month = ?', (year, month or 0))
+
+    def page_fingerprint(self, year: int, month: Optional[int], page: int) -> Optional[sqlite3.Row]:
+        """读取列表页上次合并时的指纹（digest, total_pages, items），没有时返回 None"""
+        return self.conn.execute(
+            'SELECT digest, total_pages, items FROM page_fingerprint WHERE year = ? AND month = ? AND page = ?',
+            (year, month or 0, page)).fetchone()
+
+    def save_fingerprint(self, year: int, month: Optional[int], page: int, digest: str,
+                         total_pages: int = None, items: int = 0):
+        """记录已合并列表页的指纹；与爬取清单不同，重新爬取时不会清除"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO page_fingerprint (year, month, page, digest, total_pages, items, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (year, month or 0, page, digest, total_pages, items, time.time()))
+
+    def last_crawled(self, year: int, month: Optional[int]) -> Optional[float]:
+        """(年份, 月份) 第一页上次成功爬取的时间，没有记录时返回 None"""
+        row = self.conn.execute(
+            "SELECT updated_at FROM crawl_manifest WHERE year = ? AND month = ? AND page = 1 AND status = 'done'",
+            (year, month or 0)).fetchone()
+        return row[0] if row else None
+
+    def refresh_schedule(self) -> Dict[Tuple[int, int], sqlite3.Row]:
+        """读取常驻更新的刷新计划：(年份, 月份) → 刷新间隔、上次刷新时间、页数、上次变化条数、刷新次数"""
+        return {(row['year'], row['month']): row for row in self.conn.execute('SELECT * FROM refresh_schedule')}
+
+    def save_refresh(self, year: int, month: Optional[int], interval: float, last_at: float, pages: int,
+                     changed: int):
+        """记录一次刷新的结果和下一次的刷新间隔"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO refresh_schedule (year, month, interval, last_at, pages, changed, crawls) "
+                "VALUES (?, ?, ?, ?, ?, ?, 1) ON CONFLICT (year, month) DO UPDATE SET interval = excluded.interval, "
+                "last_at = excluded.last_at, pages = excluded.pages, changed = excluded.changed, crawls = crawls + 1",
+                (year, month or 0, interval, last_at, pages, changed))
+
+    def recent_requests(self, since: float) -> List[float]:
+        """读取 since 之后发出的请求时间，使每小时请求预算跨多次运行生效"""
+        return [row[0] for row in self.conn.execute(
+            'SELECT sent_at FROM request_log WHERE sent_at > ? ORDER BY sent_at', (since,))]
+
+    def log_requests(self, sent_at: List[float], since: float):
+        """追加本次运行发出的请求时间，并清理 since 之前已移出预算窗口的记录"""
+        with self.conn:
+            self.conn.executemany('INSERT INTO request_log (sent_at) VALUES (?)', [(at,) for at in sent_at])
+            self.conn.execute('DELETE FROM request_log WHERE sent_at <= ?', (since,))
+
+    def pending_covers(self, limit: int = None, thumbnails: bool = False) -> List[str]:
+        """返回需要镜像的封面 URL
+
+        镜像索引中已有记录的 URL（包括已确认不存在的）不再下载；thumbnails 为真时，
+        之前因未安装 Pillow 而没有生成缩略图的封面会重新下载。
+        """
+        sql = '''SELECT DISTINCT a.cover FROM anime a LEFT JOIN cover_mirror c ON c.url = a.cover
+                 WHERE a.cover LIKE 'http%' AND (c.url IS NULL OR (? AND c.digest IS NOT NULL AND c.thumb IS NULL))'''
+        params = (thumbnails,)
+        if limit:
+            sql += ' LIMIT ?'
+            params += (limit,)
+        return [row[0] for row in self.conn.execute(sql, params)]
+
+    def save_covers(self, rows: List[Tuple[str, Optional[str], Optional[str], int]]):
+        """写入镜像索引：(URL, 内容哈希, 缩略图相对路径, 字节数)
+
+        哈希为空表示源站已不存在该图片；缩略图为空字符串表示图片无法解码，为 None 表示尚未生成。
+        """
+        if not rows:
+            return
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO cover_mirror (url, digest, thumb, size, fetched_at) VALUES (?, ?, ?, ?, ?)',
+                [(*row, now) for row in rows])
+
+    def cover_thumbnails(self) -> Dict[str, str]:
+        """封面 URL → 缩略图相对路径（相对缩略图目录）"""
+        return dict(self.conn.execute("SELECT url, thumb FROM cover_mirror WHERE thumb != ''").fetchall())
+
+    def years(self) -> List[int]:
+        """返回存储中出现的年份（倒序）"""
+        return [r[0] for r in self.conn.execute('SELECT DISTINCT year FROM anime ORDER BY year DESC')]
+
+    def count_by_year(self, since_seq: int = 0) -> List[Tuple[int, int]]:
+        """按年份统计入库序号不小于 since_seq 的条目数（年份倒序）"""
+        return [tuple(r) for r in self.conn.execute(
+            'SELECT year, COUNT(*) FROM anime WHERE seq >= ? GROUP BY year ORDER BY year DESC', (since_seq,))]
+
+    def frame(self, columns: Iterable[str] = tuple(COLUMN_DTYPES), since: float = 0.0):
+        """将 updated_at 晚于 since 的条目读入带类型的 DataFrame（不排序，以元组读取避免逐行构造 Row）"""
+        import pandas as pd
+
+        columns = list(columns)
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f'SELECT {", ".join(columns)} FROM anime WHERE updated_at > ?', (since,))
+        frame = pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+        return frame.astype({column: COLUMN_DTYPES[column] for column in columns})
+
+    def iter_records(self) -> Iterator[AnimeRecord]:
+        """按放送日期倒序（同日按入库先后）遍历全部条目"""
+        cursor = self.conn.execute(
+            'SELECT * FROM anime ORDER BY year DESC, month DESC, day DESC, seq')
+        for row in cursor:
+            yield AnimeRecord.from_row(row)
+
+
+class DatasetExporter:
+    """将存储导出为按年份分区的列式数据集（Parquet / CSV），供分析任务直接读取
+
+    每次只追加 updated_at 晚于上次水位线的新增/更新条目，写成各年份分区下的新分片文件；
+    同一条目可能出现在多个分片中，读取时按 subject_id 保留 updated_at 最新的一行（见 read_export）。
+    full=True 时清空并重写整个数据集，可用于压缩历史分片。
+    """
+
+    STATE_FILE = '_state.json'
+
+    def __init__(self, store: AnimeStore, directory: str = DEFAULT_EXPORT_DIR,
+                 formats: Tuple[str, ...] = EXPORT_FORMATS):
+        self.store = store
+        self.directory = directory
+        self.formats = formats
+
+    def load_state(self) -> Dict:
+        try:
+            with open(os.path.join(self.directory, self.STATE_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'watermark': 0.0}
+
+    def changed_frame(self, since: float) -> Tuple[object, float]:
+        """读取 updated_at 晚于 since 的条目，返回 (DataFrame, 新水位线)
+
+        水位线取转换前的原始浮点值：转换为 UTC 时间再转回会损失精度，下次导出会重复匹配最后一批条目。
+        """
+        import pandas as pd
+
+        frame = self.store.frame(since=since).sort_values(['year', 'subject_id'], ignore_index=True)
+        watermark = float(frame['updated_at'].max()) if len(frame) else since
+        frame['updated_at'] = pd.to_datetime(frame['updated_at'], unit='s', utc=True)
+        return frame, watermark
+
+    def export(self, full: bool = False) -> int:
+        """导出新增/更新的条目，返回导出行数"""
+        state = {'watermark': 0.0} if full else self.load_state()
+        if full:
+            for fmt in self.formats:
+                shutil.rmtree(os.path.join(self.directory, fmt), ignore_errors=True)
+
+        frame, watermark = self.changed_frame(state['watermark'])
+        if frame.empty:
+            logging.info(f"📤 导出: 没有新的变化 | 目录: {self.directory}")
+            return 0
+
+        stamp = time.strftime('%Y%m%dT%H%M%S') + f'-{os.getpid()}'
+        for fmt in self.formats:
+            base = os.path.join(self.directory, fmt)
+            if fmt == 'parquet':
+                frame.to_parquet(base, partition_cols=['year'], index=False,
+                                 basename_template=f'part-{stamp}-{{i}}.parquet')
+            else:
+                for year, rows in frame.groupby('year', sort=True):
+                    partition = os.path.join(base, f'year={year}')
+                    os.makedirs(partition, exist_ok=True)
+                    with atomic_write(os.path.join(partition, f'part-{stamp}.csv')) as f:
+                        rows.drop(columns='year').to_csv(f, index=False)
+
+        state = {'watermark': watermark, 'exported_at': time.time(),
+                 'rows': len(frame)}
+        with atomic_write(os.path.join(self.directory, self.STATE_FILE)) as f:
+            json.dump(state, f)
+        logging.info(f"📤 导出完成 | 行数: {len(frame)} | 年份分区: {frame['year'].nunique()} 个 | "
+                     f"格式: {', '.join(self.formats)} | 目录: {self.directory}")
+        return len(frame)
+
+
+def read_export(directory: str = DEFAULT_EXPORT_DIR):
+    """读取 Parquet 导出并按 subject_id 去重，保留最新的一行"""
+    import pandas as pd
+
+    frame = pd.read_parquet(os.path.join(directory, 'parquet'))
+    frame['year'] = frame['year'].astype('int16')
+    return (frame.sort_values('updated_at')
+            .drop_duplicates('subject_id', keep='last')
+            .sort_values(['year', 'subject_id'])
+            .reset_index(drop=True))
+
+
+class StatsReport:
+    """基于完整数据集的统计与排行，全部以数组运算完成
+
+    统计内容包括年份/季度分布、评分分布、按评分人数加权的排行（贝叶斯平均），
+    以及与上次运行保存的统计结果（JSON）相比的变化量。
+    """
+
+    def __init__(self, store: AnimeStore, top: int = DEFAULT_STATS_TOP, recent_years: int = STATS_RECENT_YEARS):
+        self.store = store
+        self.top = top
+        self.recent_years = recent_years
+
+    @staticmethod
+    def load(path: str) -> Optional[Dict]:
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def compute(self) -> Dict:
+        """计算当前数据集的统计结果"""
+        import numpy as np
+        import pandas as pd
+
+        frame = self.store.frame(STATS_COLUMNS)
+        year = frame['year'].to_numpy()
+        month = frame['month'].to_numpy()
+        scored = frame[frame['score'].notna() & (frame['votes'] > 0)]
+        score = scored['score'].to_numpy(dtype='float64')
+        votes = scored['votes'].to_numpy(dtype='float64')
+
+        # 年份汇总：条目数、有评分条目数、平均分、评分人数合计
+        by_year = frame.groupby('year').agg(
+            count=('subject_id', 'size'), scored=('score', 'count'),
+            mean_score=('score', 'mean'), votes=('votes', 'sum'))
+        mean_score = by_year['mean_score'].astype('float64').round(2)
+        by_year['mean_score'] = mean_score.astype(object).where(mean_score.notna(), None)
+
+        # 季度分布：月份未知（0）的条目归入“未知”
+        season = np.where(month > 0, (month - 1) // 3, len(SEASONS))
+        labels = np.array(SEASONS + ('未知',))
+        seasons = pd.crosstab(year, labels[season]).reindex(columns=labels, fill_value=0)
+
+        histogram, _ = np.histogram(score, bins=np.arange(11))
+
+        # 加权分：以评分人数中位数为先验人数，向全体加权平均分收缩
+        mean = float(np.average(score, weights=votes)) if len(score) else 0.0
+        prior = float(np.median(votes)) if len(votes) else 0.0
+        weighted = (votes * score + prior * mean) / (votes + prior)
+        ranked = scored.assign(weighted=weighted.round(3)).sort_values(
+            ['weighted', 'votes'], ascending=False, kind='stable')
+        recent = int(year.max()) - self.recent_years if len(year) else 0
+        best_by_year = ranked[ranked['year'] > recent].drop_duplicates('year').sort_values('year', ascending=False)
+
+        return {
+            'generated_at': time.time(),
+            'totals': {
+                'records': len(frame),
+                'scored': len(scored),
+                'votes': int(votes.sum()),
+                'mean_score': round(float(score.mean()), 3) if len(score) else None,
+                'weighted_mean_score': round(mean, 3),
+                'median_score': round(float(np.median(score)), 2) if len(score) else None,
+            },
+            'prior_votes': prior,
+            'years': {str(y): row for y, row in by_year.to_dict('index').items()},
+            'seasons': {str(y): row for y, row in seasons.to_dict('index').items()},
+            'score_histogram': histogram.tolist(),
+            'top': self.ranking_rows(ranked.head(self.top)),
+            'best_by_year': self.ranking_rows(best_by_year),
+        }
+
+    def ranking_rows(self, frame) -> List[Dict]:
+        """排行条目转换为字典，并补上标题"""
+        rows = frame[['subject_id', 'year', 'score', 'votes', 'weighted']].astype({'score': 'float64'}).to_dict('records')
+        records = self.store.fetch(row['subject_id'] for row in rows)
+        for row in rows:
+            row['title'] = records[row['subject_id']].title
+        return rows
+
+    @staticmethod
+    def compare(current: Dict, previous: Optional[Dict]) -> Dict:
+        """计算与上次统计结果的变化量；没有上次结果时返回空字典"""
+        if not previous:
+            return {}
+        import pandas as pd
+
+        totals = {key: round(value - previous['totals'][key], 3)
+                  for key, value in current['totals'].items()
+                  if value is not None and previous['totals'].get(key) is not None}
+        counts = pd.Series({year: row['count'] for year, row in current['years'].items()}, dtype='int64')
+        before = pd.Series({year: row['count'] for year, row in previous['years'].items()}, dtype='int64')
+        years = counts.sub(before, fill_value=0).astype('int64')
+        previous_ranks = {row['subject_id']: rank for rank, row in enumerate(previous['top'], 1)}
+        return {
+            'since': previous['generated_at'],
+            'totals': totals,
+            'years': years[years != 0].to_dict(),
+            'top': [previous_ranks.get(row['subject_id']) for row in current['top']],
+        }
+
+    def render(self, stats: Dict, changes: Dict) -> str:
+        """生成 Markdown 统计报告"""
+        totals, deltas = stats['totals'], changes.get('totals', {})
+
+        def delta(value) -> str:
+            if not changes:
+                return '-'
+            return f"{value:+g}" if value else '0'
+
+        lines = ["# Bangumi番剧统计\n\n## 概览\n\n| 指标 | 当前 | 较上次运行 |\n| --- | --- | --- |\n"]
+        for key, label in (('records', '条目数'), ('scored', '有评分条目'), ('votes', '评分人数合计'),
+                           ('mean_score', '平均评分'), ('weighted_mean_score', '加权平均评分'),
+                           ('median_score', '评分中位数')):
+            value = totals[key] if totals[key] is not None else '-'
+            lines.append(f"| {label} | {value} | {delta(deltas.get(key, 0))} |\n")
+
+        lines.append("\n## 评分分布\n\n| 评分 | 条目数 | 占比 |\n| --- | --- | --- |\n")
+        scored = totals['scored'] or 1
+        for low, count in reversed(list(enumerate(stats['score_histogram']))):
+            label = f"{low}-{low + 1}" if low < 9 else "9-10"
+            lines.append(f"| {label} | {count} | {count / scored:.1%} |\n")
+
+        lines.append(f"\n## 加权排行 Top {self.top}\n\n"
+                     f"加权分 = (评分人数 × 评分 + {stats['prior_votes']:g} × {totals['weighted_mean_score']}) / "
+                     f"(评分人数 + {stats['prior_votes']:g})，评分人数越少越向全体平均分收缩。\n\n"
+                     "| 排名 | 标题 | 年份 | 评分 | 评分人数 | 加权分 | 变化 |\n"
+                     "| --- | --- | --- | --- | --- | --- | --- |\n")
+        moves = changes.get('top', [])
+        for rank, row in enumerate(stats['top'], 1):
+            before = moves[rank - 1] if rank <= len(moves) else None
+            move = '-' if not changes else '新' if before is None else f"{before - rank:+d}" if before != rank else '0'
+            lines.append(f"| {rank} | [{row['title']}](https://bangumi.tv/subject/{row['subject_id']}) | "
+                         f"{row['year']} | {row['score']:.1f} | {row['votes']} | {row['weighted']:.2f} | {move} |\n")
+
+        lines.append(f"\n## 近{self.recent_years}年各年最佳\n\n| 年份 | 标题 | 评分 | 评分人数 | 加权分 |\n"
+                     "| --- | --- | --- | --- | --- |\n")
+        for row in stats['best_by_year']:
+            lines.append(f"| {row['year']} | [{row['title']}](https://bangumi.tv/subject/{row['subject_id']}) | "
+                         f"{row['score']:.1f} | {row['votes']} | {row['weighted']:.2f} |\n")
+
+        lines.append(f"\n## 近{self.recent_years}年分布\n\n"
+                     f"| 年份 | {' | '.join(SEASONS)} | 未知 | 合计 | 平均评分 | 较上次运行 |\n"
+                     f"| --- |{' --- |' * (len(SEASONS) + 4)}\n")
+        year_deltas = changes.get('years', {})
+        for year in sorted(stats['years'], key=int, reverse=True)[:self.recent_years]:
+            row, season = stats['years'][year], stats['seasons'][year]
+            mean = row['mean_score'] if row['mean_score'] is not None else '-'
+            lines.append(f"| {year} | {' | '.join(str(season[name]) for name in SEASONS)} | {season['未知']} | "
+                         f"{row['count']} | {mean} | {delta(year_deltas.get(year, 0))} |\n")
+        return ''.join(lines)
+
+    def write(self, markdown_path: str, json_path: str = DEFAULT_STATS_JSON) -> Dict:
+        """计算统计、与上次结果对比，写入 Markdown 报告和 JSON，返回统计结果"""
+        started = time.perf_counter()
+        stats = self.compute()
+        changes = self.compare(stats, self.load(json_path))
+        rewritten = write_if_changed(markdown_path, self.render(stats, changes))
+        if os.path.dirname(json_path):
+            os.makedirs(os.path.dirname(json_path), exist_ok=True)
+        with atomic_write(json_path) as f:
+            json.dump(dict(stats, changes=changes), f, ensure_ascii=False, indent=2)
+        logging.info(f"📈 统计报告{'已更新' if rewritten else '未变化'} | 条目: {stats['totals']['records']} | "
+                     f"耗时: {(time.perf_counter() - started) * 1000:.0f} ms | {os.path.abspath(markdown_path)}")
+        return stats
+
+
+class CoverMirror:
+    """封面图片的本地内容寻址存储
+
+    原图以 SHA-256 命名存放在 cover_dir/<前两位>/<哈希><扩展名>，相同内容只保存一份；
+    缩略图以原图哈希命名存放在 thumb_dir 下，供报告以相对路径引用。
+    下载过的 URL 记录在数据库的镜像索引中（见 AnimeStore.pending_covers），再次运行时跳过。
+    """
+
+    def __init__(self, cover_dir: str = DEFAULT_COVER_DIR, thumb_dir: str = DEFAULT_THUMB_DIR):
+        self.cover_dir = cover_dir
+        self.thumb_dir = thumb_dir
+        self.thumbnails = importlib.util.find_spec('PIL') is not None
+
+    @staticmethod
+    def extension(body: bytes) -> str:
+        for signature, ext in COVER_SIGNATURES:
+            if body.startswith(signature):
+                return ext
+        return '.img'
+
+    @staticmethod
+    def _write(path: str, body: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    def save(self, body: bytes) -> Tuple[str, bool]:
+        """保存原图，返回 (内容哈希, 是否为新内容)"""
+        digest = hashlib.sha256(body).hexdigest()
+        path = os.path.join(self.cover_dir, digest[:2], digest + self.extension(body))
+        if os.path.exists(path):
+            return digest, False
+        self._write(path, body)
+        return digest, True
+
+    def thumb_path(self, digest: str) -> str:
+        """缩略图相对 thumb_dir 的路径（使用 / 分隔，可直接用于报告链接）"""
+        return f"{digest[:2]}/{digest}.jpg"
+
+    def has_thumbnail(self, digest: str) -> bool:
+        return os.path.exists(os.path.join(self.thumb_dir, self.thumb_path(digest)))
+
+    def save_thumbnail(self, digest: str, thumb: bytes) -> str:
+        relative = self.thumb_path(digest)
+        self._write(os.path.join(self.thumb_dir, relative), thumb)
+        return relative
+
+
+class ShardQueue:
+    """分布式爬取的分片队列，位于协调者与各工作进程共享的 spool 目录
+
+    协调者按 (年份, 月份) 写入分片；工作进程以租约方式领取分片，爬取结果写入 results/ 下的
+    JSON Lines 文件后标记完成。租约过期（工作进程崩溃）的分片可被重新领取，失败或领取达到
+    SHARD_MAX_ATTEMPTS 次的分片标记为 failed。队列使用回滚日志而非 WAL，以便多台主机通过共享目录访问。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS shard (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_until REAL,
+            items INTEGER,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (year, month)
+        );
+    """
+
+    def __init__(self, spool_dir: str = DEFAULT_SPOOL_DIR, lease: float = SHARD_LEASE_SECONDS):
+        self.spool_dir = spool_dir
+        self.results_dir = os.path.join(spool_dir, 'results')
+        self.lease = lease
+        os.makedirs(self.results_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(spool_dir, 'queue.db'), timeout=60, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(self.SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """立即获取写锁的事务，保证多个进程领取分片时互斥"""
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+
+    def plan(self, units: Iterable[Tuple[int, Optional[int]]], reset: bool = True) -> int:
+        """写入分片，返回分片数；reset 为假时保留已有分片的状态（用于继续中断的分布式爬取）"""
+        now = time.time()
+        with self.transaction() as conn:
+            if reset:
+                conn.execute('DELETE FROM shard')
+                for name in os.listdir(self.results_dir):
+                    os.remove(os.path.join(self.results_dir, name))
+            conn.executemany('INSERT OR IGNORE INTO shard (year, month, updated_at) VALUES (?, ?, ?)',
+                             [(year, month or 0, now) for year, month in units])
+            return conn.execute('SELECT COUNT(*) FROM shard').fetchone()[0]
+
+    @staticmethod
+    def _expire(conn: sqlite3.Connection, now: float):
+        """租约已过期且领取次数达到上限的分片（工作进程反复崩溃）标记为失败，不再重新领取"""
+        conn.execute("UPDATE shard SET status = 'failed', lease_until = NULL, updated_at = ? "
+                     "WHERE status = 'claimed' AND lease_until < ? AND attempts >= ?", (now, now, SHARD_MAX_ATTEMPTS))
+
+    def expire(self):
+        now = time.time()
+        with self.transaction() as conn:
+            self._expire(conn, now)
+
+    def claim(self, worker: str) -> Optional[Tuple[int, Optional[int]]]:
+        """领取一个待处理或租约已过期的分片，没有可领取的分片时返回 None"""
+        now = time.time()
+        with self.transaction() as conn:
+            self._expire(conn, now)
+            row = conn.execute(
+                "SELECT year, month FROM shard WHERE status = 'pending' OR (status = 'claimed' AND lease_until < ?) "
+                "ORDER BY attempts, year DESC, month DESC LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE shard SET status = 'claimed', worker = ?, attempts = attempts + 1, lease_until = ?, "
+                "updated_at = ? WHERE year = ? AND month = ?",
+                (worker, now + self.lease, now, row['year'], row['month']))
+        return row['year'], row['month'] or None
+
+    def renew(self, year: int, month: Optional[int], worker: str):
+        """延长租约；分片已被其他工作进程领取时不做修改"""
+        with self.transaction() as conn:
+            conn.execute("UPDATE shard SET lease_until = ? WHERE year = ? AND month = ? AND worker = ? "
+                         "AND status = 'claimed'", (time.time() + self.lease, year, month or 0, worker))
+
+    def result_path(self, year: int, month: Optional[int]) -> str:
+        return os.path.join(self.results_dir, f"{year}-{month or 0:02d}.jsonl")
+
+    def complete(self, year: int, month: Optional[int], records: List[AnimeRecord]):
+        """写入分片结果文件并标记分片完成"""
+        with atomic_write(self.result_path(year, month)) as f:
+            f.writelines(json.dumps(record.as_row(), ensure_ascii=False) + '\n' for record in records)
+        with self.transaction() as conn:
+            conn.execute("UPDATE shard SET status = 'done', items = ?, lease_until = NULL, updated_at = ? "
+                         "WHERE year = ? AND month = ?", (len(records), time.time(), year, month or 0))
+
+    def fail(self, year: int, month: Optional[int]):
+        """分片爬取失败：未达到重试上限时放回队列"""
+        with self.transaction() as conn:
+            conn.execute("UPDATE shard SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                         "lease_until = NULL, updated_at = ? WHERE year = ? AND month = ?",
+                         (SHARD_MAX_ATTEMPTS, time.time(), year, month or 0))
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的分片数"""
+        return {row['status']: row['n'] for row in self.conn.execute(
+            'SELECT status, COUNT(*) AS n FROM shard GROUP BY status')}
+
+    def claimable(self) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM shard WHERE status = 'pending' "
+            "OR (status = 'claimed' AND lease_until < ? AND attempts < ?)",
+            (time.time(), SHARD_MAX_ATTEMPTS)).fetchone()[0]
+
+    def iter_results(self) -> Iterator[Tuple[int, Optional[int], List[AnimeRecord]]]:
+        """按年份、月份顺序读取已完成但尚未合并的分片结果"""
+        rows = self.conn.execute("SELECT year, month FROM shard WHERE status = 'done' ORDER BY year, month").fetchall()
+        for row in rows:
+            with open(self.result_path(row['year'], row['month']), encoding='utf-8') as f:
+                records = [AnimeRecord.from_row(json.loads(line)) for line in f]
+            yield row['year'], row['month'] or None, records
+
+    def mark_merged(self, year: int, month: Optional[int]):
+        with self.transaction() as conn:
+            conn.execute("UPDATE shard SET status = 'merged', updated_at = ? WHERE year = ? AND month = ?",
+                         (time.time(), year, month or 0))
+
+
+@dataclass(slots=True)
+class RefreshUnit:
+    """常驻更新调度的一个单元：近两年按月，更早的年份按年"""
+    year: int
+    month: Optional[int]
+    tier: str
+    interval: float
+    last_at: float
+    pages: int = 1
+    crawls: int = 0
+
+    @property
+    def label(self) -> str:
+        return f"{self.year}-{self.month:02d}" if self.month else str(self.year)
+
+    def priority(self, now: float) -> float:
+        """距上次刷新经过的时间与刷新间隔之比，不小于 1 表示已到期"""
+        return (now - self.last_at) / self.interval
+
+
+class RefreshScheduler:
+    """常驻更新的优先级调度
+
+    单元按放送时间分为放送中、近期和往年三层，各层有各自的初始、最短和最长刷新间隔（REFRESH_TIERS）。
+    每次刷新后，有条目新增或更新的单元间隔缩短，没有变化的单元间隔延长，
+    因此评分仍在变动的季度会被更频繁地访问。刷新计划保存在数据库中，重启后继续生效；
+    单元随时间进入更旧的层级时，间隔被限制到新层级的范围内。
+    """
+
+    def __init__(self, store: AnimeStore, since_year: int = DEFAULT_DAEMON_SINCE_YEAR):
+        self.store = store
+        self.since_year = since_year
+
+    def units(self, now: float) -> List[RefreshUnit]:
+        """按当前日期列出全部单元（从新到旧）；从未由调度刷新的单元以爬取清单中的上次爬取时间为准"""
+        local = time.localtime(now)
+        current_year, current_month = local.tm_year, local.tm_mon
+        schedule = self.store.refresh_schedule()
+        units = []
+        for year in range(current_year, min(self.since_year, current_year) - 1, -1):
+            if year > current_year - DAEMON_MONTHLY_YEARS:
+                months = range(current_month if year == current_year else 12, 0, -1)
+            else:
+                months = [None]
+            for month in months:
+                if month is None:
+                    tier = 'archive'
+                elif (current_year - year) * 12 + current_month - month < DAEMON_AIRING_MONTHS:
+                    tier = 'airing'
+                else:
+                    tier = 'recent'
+                initial, shortest, longest = REFRESH_TIERS[tier]
+                row = schedule.get((year, month or 0))
+                if row:
+                    unit = RefreshUnit(year, month, tier, min(longest, max(shortest, row['interval'])),
+                                       row['last_at'], row['pages'], row['crawls'])
+                else:
+                    unit = RefreshUnit(year, month, tier, initial, self.store.last_crawled(year, month) or 0.0)
+                units.append(unit)
+        return units
+
+    def next_due(self, now: float) -> Tuple[Optional[RefreshUnit], float]:
+        """返回优先级最高的到期单元；没有到期单元时返回 (None, 距最近一个单元到期的秒数)"""
+        units = self.units(now)
+        unit = max(units, key=lambda u: u.priority(now))
+        if unit.priority(now) >= 1:
+            return unit, 0.0
+        return None, min(u.last_at + u.interval for u in units) - now
+
+    def record(self, unit: RefreshUnit, changed: int, pages: int, now: float, failed: bool = False) -> float:
+        """记录一次刷新并按变化调整间隔，返回新的间隔
+
+        单元第一次由调度刷新（新增条目反映的是首次入库而不是变化）或有页面最终失败时间隔不变。
+        """
+        _, shortest, longest = REFRESH_TIERS[unit.tier]
+        factor = 1.0 if failed or not unit.crawls else REFRESH_SPEEDUP if changed else REFRESH_SLOWDOWN
+        interval = min(longest, max(shortest, unit.interval * factor))
+        self.store.save_refresh(unit.year, unit.month, interval, now, pages, changed)
+        return interval
+
+
+class HttpCache:
+    """列表页（及另一个实例中的详情页）的本地HTTP缓存
+
+    每个URL保存响应体及 ETag/Last-Modified，过期后发送条件请求重新验证。
+    有效期按放送年份距今的年数分档，超过总大小上限时按最近访问时间淘汰。
+    离线模式下只读缓存目录，可用于无网络回放和解析基准测试。
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, ttl: str = DEFAULT_CACHE_TTL,
+                 max_mb: int = DEFAULT_CACHE_MAX_MB, offline: bool = False):
+        self.cache_dir = cache_dir
+        self.ttl_rules = self.parse_ttl(ttl)
+        self.max_bytes = max_mb * 1024 * 1024
+        self.offline = offline
+        self.current_year = time.localtime().tm_year
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self._scan())
+
+    @staticmethod
+    def parse_ttl(spec: str) -> List[Tuple[int, Optional[float]]]:
+        """解析有效期配置，格式为 "年数:秒数,..."，秒数为 inf 表示永久有效"""
+        rules = []
+        for part in spec.split(','):
+            age, _, seconds = part.strip().partition(':')
+            if not age.isdigit() or not seconds:
+                raise ValueError(f"无效的缓存有效期配置: {part}")
+            rules.append((int(age), None if seconds == 'inf' else float(seconds)))
+        return sorted(rules)
+
+    def ttl_for(self, year: Optional[int]) -> Optional[float]:
+        """返回指定放送年份页面的缓存有效期，None 表示永不重新验证"""
+        age = self.current_year - year if year else 0
+        ttl = 0.0
+        for min_age, seconds in self.ttl_rules:
+            if age >= min_age:
+                ttl = seconds
+        return ttl
+
+    def _paths(self, url: str) -> Tuple[str, str]:
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return f"{base}.json", f"{base}.html"
+
+    def _scan(self) -> Iterator[Tuple[str, int, float]]:
+        """遍历缓存条目，产出 (元数据路径, 占用字节, 最近访问时间)"""
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    meta_path = os.path.join(root, name)
+                    body_path = meta_path[:-5] + '.html'
+                    try:
+                        size = os.path.getsize(meta_path) + os.path.getsize(body_path)
+                        yield meta_path, size, os.path.getmtime(meta_path)
+                    except OSError:
+                        continue
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """读取缓存元数据，未命中时返回 None"""
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if os.path.exists(body_path) else None
+
+    def is_fresh(self, entry: Dict, year: Optional[int]) -> bool:
+        ttl = self.ttl_for(year)
+        return ttl is None or time.time() - entry['fetched_at'] < ttl
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict]) -> Dict[str, str]:
+        """根据缓存的验证字段生成条件请求头"""
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def read(self, url: str) -> bytes:
+        """读取缓存的响应体，并刷新访问时间"""
+        meta_path, body_path = self._paths(url)
+        with open(body_path, 'rb') as f:
+            body = f.read()
+        if not self.offline:
+            os.utime(meta_path)
+        return body
+
+    def _write_meta(self, meta_path: str, entry: Dict):
+        tmp_path = f"{meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+
+    def revalidated(self, url: str, entry: Dict):
+        """服务器返回 304 时刷新缓存时间"""
+        entry['fetched_at'] = time.time()
+        self._write_meta(self._paths(url)[0], entry)
+
+    def save(self, url: str, body: bytes, headers) -> None:
+        """保存响应体及验证字段"""
+        if self.offline:
+            return
+        meta_path, body_path = self._paths(url)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        old_size = 0
+        if os.path.exists(meta_path) and os.path.exists(body_path):
+            old_size = os.path.getsize(meta_path) + os.path.getsize(body_path)
+
+        tmp_path = f"{body_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, body_path)
+        self._write_meta(meta_path, {
+            'url': url,
+            'etag': headers.get('ETag', ''),
+            'last_modified': headers.get('Last-Modified', ''),
+            'fetched_at': time.time()
+        })
+
+        self.total_bytes += os.path.getsize(meta_path) + len(body) - old_size
+        if self.total_bytes > self.max_bytes:
+            self.prune()
+
+    def prune(self):
+        """按最近访问时间淘汰缓存，直到总大小降到上限的 90% 以下"""
+        entries = sorted(self._scan(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for meta_path, size, _ in entries:
+            if total <= target:
+                break
+            for path in (meta_path, meta_path[:-5] + '.html'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        self.total_bytes = total
+        if removed:
+            logging.info(f"🧹 HTTP缓存淘汰 {removed} 条 | 当前大小: {total / 1024 / 1024:.1f} MB")
+
+
+class TokenBucket:
+    """令牌桶限速器"""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """取得一个令牌，令牌不足时等待"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RequestBudget:
+    """全局请求预算：任意一小时（滑动窗口）内最多发出 limit 个请求，重试也计入
+
+    请求时间使用墙上时间，可以写入数据存储并在下次运行时载入，使 cron 定时的多次运行共用同一预算。
+    """
+
+    def __init__(self, limit: int, window: float = 3600.0):
+        self.limit = limit
+        self.window = window
+        self.sent = deque()
+        self.unsaved: List[float] = []
+        self.lock = asyncio.Lock()
+
+    def restore(self, sent_at: Iterable[float]):
+        """载入之前运行记录的请求时间，须在发出请求之前调用"""
+        self.sent.extendleft(sorted(sent_at, reverse=True))
+
+    def drain(self) -> List[float]:
+        """取出尚未保存的请求时间"""
+        sent_at, self.unsaved = self.unsaved, []
+        return sent_at
+
+    def wait_time(self, count: int = 1) -> float:
+        """还需等待多少秒才能在预算内发出 count 个请求"""
+        now = time.time()
+        while self.sent and self.sent[0] <= now - self.window:
+            self.sent.popleft()
+        excess = len(self.sent) + min(count, self.limit) - self.limit
+        return self.sent[excess - 1] + self.window - now if excess > 0 else 0.0
+
+    async def acquire(self):
+        """记录一个请求，预算用尽时等待窗口内最早的请求过期"""
+        async with self.lock:
+            while (delay := self.wait_time()) > 0:
+                await asyncio.sleep(delay)
+            now = time.time()
+            self.sent.append(now)
+            self.unsaved.append(now)
+
+
+class AdaptiveLimiter:
+    """AIMD 自适应并发控制器
+
+    每完成与当前并发数相当的成功请求，并发上限加一；遇到 429/5xx 或超时时减半，
+    冷却期内只减半一次，避免同一波失败把并发压到最低。
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = None, cooldown: float = 5.0):
+        self.minimum = minimum
+        self.maximum = max(maximum or initial, initial)
+        self.limit = initial
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        """加性增长"""
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.maximum:
+            self._successes = 0
+            self.limit += 1
+            logging.debug(f"并发上限提升至 {self.limit}")
+
+    def on_overload(self):
+        """乘性减少"""
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._successes = 0
+        new_limit = max(self.minimum, self.limit // 2)
+        if new_limit != self.limit:
+            logging.info(f"⚠️ 服务器繁忙，并发上限 {self.limit} → {new_limit}")
+            self.limit = new_limit
+
+
+class Histogram:
+    """固定桶的耗时直方图"""
+
+    def __init__(self, buckets: Tuple[float, ...] = METRICS_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """按桶上界估算分位数，不超过观测到的最大值；落在最后一个桶时返回最大值"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict:
+        """摘要中的耗时统一保留 4 位小数，先限幅再舍入，保证 p50 ≤ p95 ≤ max"""
+        return {'count': self.count, 'sum': round(self.sum, 4), 'mean': round(self.sum / self.count, 4) if self.count else 0.0,
+                'p50': round(self.quantile(0.5), 4), 'p95': round(self.quantile(0.95), 4), 'max': round(self.max, 4)}
+
+
+class Metrics:
+    """运行指标：带标签的计数器、耗时直方图和阶段耗时
+
+    运行结束时输出 JSON 摘要，也可写成 Prometheus textfile 供 node_exporter 采集。
+    """
 
-class BangumiScraper:
     def __init__(self):
-        self.semaphore = None
+        self.started = time.monotonic()
+        self.cpu_started = time.process_time()
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.stages: Dict[str, float] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+        self.histograms[name].observe(value)
+
+    @contextmanager
+    def stage(self, name: str):
+        """累计一个阶段的耗时（同名阶段多次进入时累加）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def summary(self) -> Dict:
+        counters: Dict[str, Dict] = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            label = ','.join(f'{k}={v}' for k, v in labels) or 'total'
+            counters.setdefault(name, {})[label] = value
+        return {
+            'wall_seconds': round(time.monotonic() - self.started, 3),
+            'cpu_seconds': round(time.process_time() - self.cpu_started, 3),
+            'stages': {name: round(seconds, 3) for name, seconds in self.stages.items()},
+            'counters': counters,
+            'histograms': {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+        }
+
+    @staticmethod
+    def sample_value(value: float) -> str:
+        """Prometheus 样本值：整数精确输出，浮点数使用可往返的最短表示"""
+        return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+    def write_prometheus(self, path: str):
+        """以 Prometheus 文本格式原子写入指标"""
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f'# TYPE {METRICS_PREFIX}{name} counter')
+            for (metric, labels), value in sorted(self.counters.items()):
+                if metric == name:
+                    label = ','.join(f'{k}="{v}"' for k, v in labels)
+                    value = self.sample_value(value)
+                    lines.append(f'{METRICS_PREFIX}{name}{{{label}}} {value}' if label else
+                                 f'{METRICS_PREFIX}{name} {value}')
+        for name, histogram in sorted(self.histograms.items()):
+            lines.append(f'# TYPE {METRICS_PREFIX}{name} histogram')
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{METRICS_PREFIX}{name}_bucket{{le="{bound:g}"}} {cumulative}')
+            lines.append(f'{METRICS_PREFIX}{name}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f'{METRICS_PREFIX}{name}_sum {histogram.sum:.6f}')
+            lines.append(f'{METRICS_PREFIX}{name}_count {histogram.count}')
+        summary = self.summary()
+        lines.append(f'# TYPE {METRICS_PREFIX}stage_seconds gauge')
+        lines.extend(f'{METRICS_PREFIX}stage_seconds{{stage="{name}"}} {seconds:.6f}'
+                     for name, seconds in self.stages.items())
+        lines.append(f'# TYPE {METRICS_PREFIX}run_wall_seconds gauge')
+        lines.append(f"{METRICS_PREFIX}run_wall_seconds {summary['wall_seconds']}")
+        lines.append(f'# TYPE {METRICS_PREFIX}run_cpu_seconds gauge')
+        lines.append(f"{METRICS_PREFIX}run_cpu_seconds {summary['cpu_seconds']}")
+        with atomic_write(path) as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+class RequestEngine:
+    """所有HTTP请求共用的请求引擎：按主机令牌桶限速、AIMD 并发控制、指数退避重试
+
+    返回 200/304 响应；429/5xx/网络错误会按 Retry-After 或带抖动的指数退避重试，
+    其余错误状态码直接抛出。重试耗尽后抛出最后一次的异常。
+    并发上限由 ScraperConfig 决定，未指定 max_concurrency 时并发固定为 concurrency。
+    """
+
+    def __init__(self, concurrency: int = MAX_CONCURRENT, max_concurrency: int = None,
+                 rate: float = DEFAULT_RATE_LIMIT, max_retries: int = DEFAULT_MAX_RETRIES, metrics: Metrics = None,
+                 budget: RequestBudget = None):
+        self.limiter = AdaptiveLimiter(concurrency, maximum=max_concurrency)
+        self.rate = rate
+        self.max_retries = max_retries
+        self.budget = budget
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.metrics = metrics or Metrics()
+
+    def bucket(self, host: str) -> TokenBucket:
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate)
+        return self.buckets[host]
+
+    @staticmethod
+    def backoff(attempt: int) -> float:
+        """带完全抖动的指数退避"""
+        return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)) + RETRY_BASE_DELAY
+
+    @staticmethod
+    def retry_after(value: Optional[str]) -> Optional[float]:
+        """解析 Retry-After（秒数或HTTP日期）"""
+        if not value:
+            return None
+        if value.strip().isdigit():
+            return min(RETRY_MAX_DELAY, float(value))
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+        return min(RETRY_MAX_DELAY, max(0.0, delay))
+
+    async def request(self, session: aiohttp.ClientSession, url: str,
+                      headers: Dict[str, str]) -> Tuple[int, Dict, bytes]:
+        """发送GET请求，返回 (状态码, 响应头, 响应体)"""
+        bucket = self.bucket(urlsplit(url).netloc)
+        metrics = self.metrics
+        error = None
+        for attempt in range(self.max_retries + 1):
+            waited = time.perf_counter()
+            if self.budget:
+                await self.budget.acquire()
+            await bucket.acquire()
+            metrics.observe('rate_limit_wait_seconds', time.perf_counter() - waited)
+            delay = None
+            try:
+                waited = time.perf_counter()
+                async with self.limiter:
+                    started = time.perf_counter()
+                    metrics.observe('concurrency_wait_seconds', started - waited)
+                    async with session.get(url, headers=headers, timeout=REQUEST_TIMEOUT) as resp:
+                        if resp.status in (200, 304):
+                            body = await resp.read()
+                            self.limiter.on_success()
+                            metrics.observe('request_latency_seconds', time.perf_counter() - started)
+                            metrics.inc('requests_total', status=resp.status)
+                            metrics.inc('downloaded_bytes_total', len(body))
+                            return resp.status, resp.headers, body
+
+                        metrics.observe('request_latency_seconds', time.perf_counter() - started)
+                        metrics.inc('requests_total', status=resp.status)
+                        error = aiohttp.ClientResponseError(
+                            resp.request_info, resp.history, status=resp.status, headers=resp.headers)
+                        if resp.status != 429 and resp.status < 500:
+                            raise error
+                        self.limiter.on_overload()
+                        delay = self.retry_after(resp.headers.get('Retry-After'))
+            except asyncio.TimeoutError as e:
+                self.limiter.on_overload()
+                metrics.inc('requests_total', status='timeout')
+                error = e
+            except aiohttp.ClientResponseError:
+                raise
+            except aiohttp.ClientError as e:
+                metrics.inc('requests_total', status='error')
+                error = e
+
+            if attempt < self.max_retries:
+                metrics.inc('retries_total')
+                delay = delay if delay is not None else self.backoff(attempt)
+                logging.info(f"请求失败: {url}，错误: {str(error) or type(error).__name__}，"
+                             f"{delay:.1f} 秒后重试（剩余 {self.max_retries - attempt} 次）")
+                await asyncio.sleep(delay)
+        raise error
+
+
+@dataclass
+class ScraperConfig:
+    """爬虫运行配置，在进入 BangumiScraper 的异步上下文时生效
+
+    concurrency 是自适应并发的起点，max_concurrency 是其上限（默认为起点的 4 倍，
+    可由环境变量 CONCURRENT_CEILING 指定）。各阶段并发数为 0 时不单独限制，只受共享上限约束。
+    request_budget 为每小时请求数上限，0 表示不限制。
+    """
+    concurrency: int = MAX_CONCURRENT
+    max_concurrency: Optional[int] = None
+    probe_concurrency: int = 0
+    listing_concurrency: int = 0
+    detail_concurrency: int = DEFAULT_ENRICH_CONCURRENCY
+    cover_concurrency: int = DEFAULT_COVER_CONCURRENCY
+    rate_limit: float = DEFAULT_RATE_LIMIT
+    max_retries: int = DEFAULT_MAX_RETRIES
+    keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT
+    dns_cache_ttl: int = DEFAULT_DNS_CACHE_TTL
+    limit_per_host: int = 0
+    parser_backend: str = DEFAULT_PARSER
+    parse_executor: str = DEFAULT_PARSE_EXECUTOR
+    parse_workers: Optional[int] = None
+    skip_unchanged: bool = True
+    request_budget: int = 0
+
+    def __post_init__(self):
+        if self.concurrency < 1:
+            raise ValueError("并发数必须大于0")
+        if not self.max_concurrency:
+            ceiling = os.environ.get('CONCURRENT_CEILING')
+            self.max_concurrency = int(ceiling) if ceiling else self.concurrency * 4
+        self.max_concurrency = max(self.max_concurrency, self.concurrency)
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> 'ScraperConfig':
+        return cls(
+            concurrency=args.concurrent, max_concurrency=args.max_concurrent,
+            probe_concurrency=args.probe_concurrency, listing_concurrency=args.listing_concurrency,
+            detail_concurrency=args.detail_concurrency, cover_concurrency=args.cover_concurrency,
+            rate_limit=args.rate_limit, max_retries=args.max_retries,
+            keepalive_timeout=args.keepalive_timeout, dns_cache_ttl=args.dns_cache_ttl,
+            limit_per_host=args.limit_per_host, parser_backend=args.parser,
+            parse_executor=args.parse_executor, parse_workers=args.parse_workers, skip_unchanged=not args.reparse,
+            request_budget=args.request_budget)
+
+    def to_argv(self) -> List[str]:
+        """还原为命令行参数，与 from_args 互逆，用于启动使用相同配置的子进程"""
+        flags = [('concurrency', '--concurrent'), ('max_concurrency', '--max-concurrent'),
+                 ('probe_concurrency', '--probe-concurrency'), ('listing_concurrency', '--listing-concurrency'),
+                 ('detail_concurrency', '--detail-concurrency'), ('cover_concurrency', '--cover-concurrency'),
+                 ('rate_limit', '--rate-limit'), ('max_retries', '--max-retries'),
+                 ('keepalive_timeout', '--keepalive-timeout'), ('dns_cache_ttl', '--dns-cache-ttl'),
+                 ('limit_per_host', '--limit-per-host'), ('parser_backend', '--parser'),
+                 ('parse_executor', '--parse-executor'), ('parse_workers', '--parse-workers'),
+                 ('request_budget', '--request-budget')]
+        argv = []
+        for name, flag in flags:
+            value = getattr(self, name)
+            if value is not None:
+                argv += [flag, str(value)]
+        if not self.skip_unchanged:
+            argv.append('--reparse')
+        return argv
+
+    def phase_limits(self) -> Dict[str, asyncio.Semaphore]:
+        """各阶段的并发信号量，未单独限制的阶段不包含在内；详情阶段由工作协程数限制"""
+        limits = {'probe': self.probe_concurrency, 'page': self.listing_concurrency, 'cover': self.cover_concurrency}
+        return {phase: asyncio.Semaphore(limit) for phase, limit in limits.items() if limit > 0}
+
+
+class BangumiScraper:
+    def __init__(self, config: ScraperConfig = None):
+        self.config = config or ScraperConfig()
+        self.store = None
+        self.cache = None
+        self.detail_cache = None
+        self.parser_backend = self.config.parser_backend
+        self.output_mode = DEFAULT_OUTPUT_MODE
+        self.executor = None
+        self.engine = None
+        self.phase_limits: Dict[str, asyncio.Semaphore] = {}
+        self.thumb_dir = None
+        self.failed_jobs = []
         self.connector = None
+        self.metrics = Metrics()
         self.current_year = time.localtime().tm_year
         self.current_month = time.localtime().tm_mon
+        self._job_seq = itertools.count()
 
     async def __aenter__(self):
-        """异步上下文管理器入口"""
-        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT)
-        self.connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT, ssl=False)
+        """异步上下文管理器入口：按配置创建请求引擎、连接池和解析执行器"""
+        config = self.config
+        self.parser_backend = config.parser_backend
+        self.engine = RequestEngine(config.concurrency, config.max_concurrency, config.rate_limit,
+                                    config.max_retries, metrics=self.metrics,
+                                    budget=RequestBudget(config.request_budget) if config.request_budget else None)
+        self.phase_limits = config.phase_limits()
+        self.connector = aiohttp.TCPConnector(
+            limit=config.max_concurrency, limit_per_host=config.limit_per_host,
+            keepalive_timeout=config.keepalive_timeout, ttl_dns_cache=config.dns_cache_ttl, ssl=False)
+        self.executor = create_parse_executor(config.parse_executor, config.parse_workers)
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
         """异步上下文管理器出口"""
         await self.connector.close()
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.store:
+            self.store.close()
+
+    async def fetch_html(self, session: aiohttp.ClientSession, url: str, year: int = None,
+                         cache: HttpCache = None) -> Optional[bytes]:
+        """获取页面内容，优先使用HTTP缓存（默认为列表页缓存）；离线模式下缓存未命中时返回 None"""
+        cache = cache or self.cache
+        entry = cache.lookup(url) if cache else None
+        if entry and (cache.offline or cache.is_fresh(entry, year)):
+            self.metrics.inc('cache_lookups_total', result='hit')
+            return cache.read(url)
+        if cache and cache.offline:
+            self.metrics.inc('cache_lookups_total', result='offline_miss')
+            logging.info(f"离线模式缓存未命中: {url}")
+            return None
+
+        headers = {**HEADERS, **HttpCache.conditional_headers(entry)}
+        status, resp_headers, body = await self.engine.request(session, url, headers)
+        if status == 304 and entry:
+            self.metrics.inc('cache_lookups_total', result='revalidated')
+            cache.revalidated(url, entry)
+            return cache.read(url)
+
+        if cache:
+            self.metrics.inc('cache_lookups_total', result='stale' if entry else 'miss')
+            cache.save(url, body, resp_headers)
+        return body
+
+    def record_failure(self, kind: str, base_url: str, year: int, month: int = None, page: int = None,
+                       retryable: bool = True):
+        """记录失败的任务：可重试的在本轮爬取结束前重新尝试，不可重试的直接记为最终失败"""
+        self.failed_jobs.append((kind, base_url, year, month, page, retryable))
 
-    async def fetch_pages(self, session: aiohttp.ClientSession, url: str) -> int:
-        """获取总页数"""
-        retries = 3
-        while retries > 0:
-            try:
-                async with session.get(url, headers=HEADERS, timeout=20) as resp:
-                    if resp.status != 200:
-                        raise aiohttp.ClientResponseError(
-                            resp.request_info, resp.history, status=resp.status)
-
-                    soup = BeautifulSoup(await resp.text(), 'lxml')
-                    pagination = soup.select_one('.page_inner')
-
-                    if not pagination:
-                        return 1
+    @staticmethod
+    def is_retryable(error: BaseException) -> bool:
+        """网络错误、超时、429 与 5xx 可重试；其余 4xx 和解析等错误重试也不会成功"""
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status == 429 or error.status >= 500
+        return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
 
-                    last_page = 1
-                    for page in pagination.select('a.p'):
-                        if page.text.isdigit():
-                            last_page = max(last_page, int(page.text))
-                    return last_page
+    @staticmethod
+    def parse_page_count(soup: BeautifulSoup) -> int:
+        """从分页栏解析总页数"""
+        pagination = soup.select_one('.page_inner')
+        if not pagination:
+            return 1
+
+        last_page = 1
+        for page in pagination.select('a.p'):
+            if page.text.isdigit():
+                last_page = max(last_page, int(page.text))
+        return last_page
+
+    async def probe_pages(self, session: aiohttp.ClientSession, base_url: str, year: int,
+                          month: int = None) -> Optional[CrawledPage]:
+        """获取第一页，其 total_pages 即总页数；失败或离线缓存未命中时返回 None"""
+        url = f"{base_url}&page=1"
+        logging.info(f"正在爬取: {url}")
 
-            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                retries -= 1
-                logging.info(f"获取页数失败: {str(e)}，剩余重试次数: {retries}")
-                await asyncio.sleep(2 + retries * 3)
-        return 0
+        try:
+            body = await self.fetch_html(session, url, year)
+            if body is None:
+                return None
+            return await self.crawl_listing(body, year, month, 1)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.info(f"获取页数失败: {url}，错误: {str(e) or type(e).__name__}")
+            self.record_failure('probe', base_url, year, month, retryable=self.is_retryable(e))
+        except Exception as e:
+            logging.warning(f"获取页数失败: {url}，错误: {str(e) or type(e).__name__}")
+            self.record_failure('probe', base_url, year, month, retryable=False)
+        return None
 
     async def scrape_page(self, session: aiohttp.ClientSession, base_url: str, page: int, year: int,
-                          month: int = None) -> List[Dict]:
-        """爬取单个页面"""
+                          month: int = None) -> Optional[CrawledPage]:
+        """爬取单个页面，失败或离线缓存未命中时返回 None"""
         url = f"{base_url}&page={page}"
         logging.info(f"正在爬取: {url}")
 
         try:
-            async with self.semaphore:
-                async with session.get(url, headers=HEADERS, timeout=20) as resp:
-                    resp.raise_for_status()
-                    soup = BeautifulSoup(await resp.text(), 'lxml')
-                    return self.parse_page(soup, year, month)
+            body = await self.fetch_html(session, url, year)
+            if body is None:
+                return None
+            return await self.crawl_listing(body, year, month, page)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.info(f"页面爬取失败: {url}，错误: {str(e) or type(e).__name__}")
+            self.record_failure('page', base_url, year, month, page, retryable=self.is_retryable(e))
         except Exception as e:
-            logging.info(f"页面爬取失败: {url}，错误: {str(e)}")
+            logging.warning(f"页面爬取失败: {url}，错误: {str(e) or type(e).__name__}")
+            self.record_failure('page', base_url, year, month, page, retryable=False)
+        return None
+
+    async def crawl_listing(self, body: bytes, year: int, month: Optional[int], page: int) -> CrawledPage:
+        """计算列表页指纹，与上次合并时相同则跳过解析，否则解析页面"""
+        fingerprint = page_fingerprint(body)
+        if self.config.skip_unchanged and self.store:
+            known = self.store.page_fingerprint(year, month, page)
+            if known and known['digest'] == fingerprint:
+                self.metrics.inc('listing_pages_total', result='unchanged')
+                return CrawledPage(year, month, page, [], known['total_pages'], fingerprint, known['items'])
+        total_pages, items = await self.parse_listing_async(body, year, month)
+        self.metrics.inc('listing_pages_total', result='parsed')
+        return CrawledPage(year, month, page, items, total_pages if page == 1 else None, fingerprint)
+
+    def parse_listing(self, body: bytes, year: int, month: int = None) -> Tuple[int, List[AnimeRecord]]:
+        """使用配置的解析后端解析列表页，返回 (总页数, 条目列表)"""
+        return parse_listing_page(body, year, month, self.parser_backend)
+
+    async def parse_listing_async(self, body: bytes, year: int, month: int = None) -> Tuple[int, List[AnimeRecord]]:
+        """在解析线程池/进程池中解析列表页，避免阻塞事件循环；解析耗时含执行器排队时间"""
+        started = time.perf_counter()
+        if self.executor is None:
+            result = self.parse_listing(body, year, month)
+        else:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self.executor, parse_listing_page, body, year, month, self.parser_backend)
+        self.metrics.observe('parse_seconds', time.perf_counter() - started)
+        self.metrics.inc('parsed_items_total', len(result[1]))
+        return result
+
+    @staticmethod
+    def parse_page_count_lxml(body: bytes) -> int:
+        """只解析分页栏片段获取总页数"""
+        fragment = extract_element(body, PAGINATION_MARKER)
+        if fragment is None:
+            return 1
+
+        last_page = 1
+        for page in XPATH_PAGE_LINKS(lxml_html.fragment_fromstring(fragment.decode('utf-8', 'replace'))):
+            text = page.text_content()
+            if text.isdigit():
+                last_page = max(last_page, int(text))
+        return last_page
+
+    @staticmethod
+    def parse_page_lxml(body: bytes, base_year: int, base_month: int = None) -> List[AnimeRecord]:
+        """只截取 #browserItemList 片段并用 XPath 解析，输出与 parse_page 一致"""
+        fragment = extract_element(body, ITEM_LIST_MARKER)
+        if fragment is None:
             return []
 
-    def parse_page(self, soup: BeautifulSoup, base_year: int, base_month: int = None) -> List[Dict]:
+        results = []
+        for item in XPATH_ITEMS(lxml_html.fragment_fromstring(fragment.decode('utf-8', 'replace'))):
+            title_tag = _first(XPATH_TITLE(item))
+            if title_tag is None or (subject_id := AnimeRecord.parse_subject_id(title_tag.attrib['href'])) is None:
+                continue
+            anime = AnimeRecord(subject_id, title=title_tag.text_content().strip())
+
+            if (jp_title := _first(XPATH_JP_TITLE(title_tag))) is not None:
+                anime.jp_title = jp_title.text_content().strip()
+
+            if (img := _first(XPATH_COVER(item))) is not None:
+                cover_url = img.get('src') or img.get('data-cfsrc', '')
+                if cover_url.startswith('//'):
+                    cover_url = f"https:{cover_url}"
+                anime.cover = cover_url
+
+            if (info := _first(XPATH_INFO(item))) is not None:
+                BangumiScraper.parse_metadata_text(info.text_content().strip(), anime, base_year, base_month)
+
+            if (rate := _first(XPATH_RATE(item))) is not None:
+                if (score := _first(XPATH_SCORE(rate))) is not None:
+                    anime.score = AnimeRecord.parse_score(score.text_content().strip())
+                if (count := _first(XPATH_VOTES(rate))) is not None:
+                    anime.votes = AnimeRecord.parse_votes(count.text_content())
+
+            results.append(anime)
+        return results
+
+    @staticmethod
+    def parse_page(soup: BeautifulSoup, base_year: int, base_month: int = None) -> List[AnimeRecord]:
         """解析页面内容（修复标题和封面问题）"""
         results = []
         for item in soup.select('#browserItemList > li.item'):
-            anime = defaultdict(str)
-
-            # 标题信息处理
+            # 标题信息处理，条目ID取自标题链接，无法识别的条目跳过
             title_tag = item.select_one('h3 > a.l')
-            if title_tag:
-                # 提取中文标题（主标题）
-                anime['title'] = title_tag.text.strip()
-                anime['url'] = f"https://bangumi.tv{title_tag['href']}"
+            if not title_tag or (subject_id := AnimeRecord.parse_subject_id(title_tag['href'])) is None:
+                continue
+            # 提取中文标题（主标题）
+            anime = AnimeRecord(subject_id, title=title_tag.text.strip())
 
-                # 提取日文标题（副标题）
-                if jp_title := title_tag.find_next_sibling('small', class_='grey'):
-                    anime['jp_title'] = jp_title.text.strip()
+            # 提取日文标题（副标题）
+            if jp_title := title_tag.find_next_sibling('small', class_='grey'):
+                anime.jp_title = jp_title.text.strip()
 
             # 封面图片处理
             if img := item.select_one('a.subjectCover img.cover'):
@@ -117,90 +2255,68 @@ class BangumiScraper:
                 cover_url = img.get('src') or img.get('data-cfsrc', '')
                 if cover_url.startswith('//'):
                     cover_url = f"https:{cover_url}"
-                anime['cover'] = cover_url
+                anime.cover = cover_url
 
             # 元数据解析
-            self.parse_metadata(item.select_one('p.info.tip'), anime, base_year, base_month)
-            self.parse_rating(item.select_one('p.rateInfo'), anime)
+            BangumiScraper.parse_metadata(item.select_one('p.info.tip'), anime, base_year, base_month)
+            BangumiScraper.parse_rating(item.select_one('p.rateInfo'), anime)
 
             results.append(anime)
         return results
 
-    def parse_metadata(self, elem: BeautifulSoup, anime: Dict, base_year: int, base_month: int = None):
+    @staticmethod
+    def parse_metadata(elem: BeautifulSoup, anime: AnimeRecord, base_year: int, base_month: int = None):
         """解析元数据"""
         if not elem:
             return
 
-        text = elem.text.strip()
+        BangumiScraper.parse_metadata_text(elem.text.strip(), anime, base_year, base_month)
 
+    @staticmethod
+    def parse_metadata_text(text: str, anime: AnimeRecord, base_year: int, base_month: int = None):
+        """从元数据文本中解析话数和放送日期"""
         # 初始化默认值
-        anime.update({
-            'year': base_year,
-            'month': base_month or 0,
-            'day': 0
-        })
+        anime.year, anime.month, anime.day = base_year, base_month or 0, 0
 
         # 话数提取
         if eps := EPS_PATTERN.search(text):
-            anime['episodes'] = eps.group(1)
+            anime.episodes = int(eps.group(1))
 
         # 日期解析 - 按优先顺序尝试不同格式
         # 1. 先尝试匹配完整的格式化日期 YYYY-MM-DD
         if formatted_date := FORMATTED_DATE_PATTERN.search(text):
-            anime.update({
-                'year': int(formatted_date.group(1)),
-                'month': int(formatted_date.group(2)),
-                'day': int(formatted_date.group(3))
-            })
+            anime.year, anime.month, anime.day = map(int, formatted_date.group(1, 2, 3))
         # 2. 尝试匹配中文完整日期 YYYY年MM月DD日
         elif full_date := FULL_DATE_PATTERN.search(text):
-            anime.update({
-                'year': int(full_date.group(1)),
-                'month': int(full_date.group(2)),
-                'day': int(full_date.group(3))
-            })
+            anime.year, anime.month, anime.day = map(int, full_date.group(1, 2, 3))
         # 3. 尝试匹配格式化年月 YYYY-MM
         elif formatted_ym := FORMATTED_YEAR_MONTH_PATTERN.search(text):
-            anime.update({
-                'year': int(formatted_ym.group(1)),
-                'month': int(formatted_ym.group(2)),
-                'day': 0
-            })
+            anime.year, anime.month, anime.day = int(formatted_ym.group(1)), int(formatted_ym.group(2)), 0
         # 4. 尝试匹配中文年月 YYYY年MM月
         elif ym_date := YEAR_MONTH_PATTERN.search(text):
-            anime.update({
-                'year': int(ym_date.group(1)),
-                'month': int(ym_date.group(2)),
-                'day': 0
-            })
+            anime.year, anime.month, anime.day = int(ym_date.group(1)), int(ym_date.group(2)), 0
         # 5. 最后尝试仅匹配年份
         elif year_only := YEAR_PATTERN.search(text):
-            anime['year'] = int(year_only.group(1))
-            anime['month'] = 0
-            anime['day'] = 0
+            anime.year, anime.month, anime.day = int(year_only.group(1)), 0, 0
         # 6. 如果以上都没匹配到，尝试直接匹配数字年份
-        elif direct_year := re.search(r'\b(\d{4})\b', text):
-            anime['year'] = int(direct_year.group(1))
-            anime['month'] = 0
-            anime['day'] = 0
+        elif direct_year := DIRECT_YEAR_PATTERN.search(text):
+            anime.year, anime.month, anime.day = int(direct_year.group(1)), 0, 0
 
     @staticmethod
-    def parse_rating(elem: BeautifulSoup, anime: Dict):
+    def parse_rating(elem: BeautifulSoup, anime: AnimeRecord):
         """解析评分信息"""
         if not elem:
             return
 
         if score := elem.select_one('span.number'):
-            anime['score'] = score.text.strip()
+            anime.score = AnimeRecord.parse_score(score.text.strip())
 
         if count := elem.select_one('span.tip_j'):
-            anime['votes'] = count.text.strip('()')
-
-    async def scrape_time_range(self, session: aiohttp.ClientSession, start_year: int, end_year: int,
-                                start_month: int = None, end_month: int = None) -> List[Dict]:
-        """处理时间范围爬取"""
-        all_data = []
+            anime.votes = AnimeRecord.parse_votes(count.text)
 
+    def iter_units(self, start_year: int, end_year: int, start_month: int = None,
+                   end_month: int = None) -> Iterator[Tuple[int, Optional[int], str]]:
+        """枚举时间范围内需要爬取的 (年份, 月份, 列表URL)"""
         for year in range(start_year, end_year + 1):
             # 当输入年份范围时，忽略月份参数
             if start_year != end_year:
@@ -210,156 +2326,629 @@ class BangumiScraper:
 
             for month in months:
                 if month:
-                    url = f"https://bangumi.tv/anime/browser/airtime/{year}-{month:02d}?sort=date"
+                    url = f"{BASE_URL}/anime/browser/airtime/{year}-{month:02d}?sort=date"
                 else:
-                    url = f"https://bangumi.tv/anime/browser/airtime/{year}?sort=date"
+                    url = f"{BASE_URL}/anime/browser/airtime/{year}?sort=date"
 
                 if year == self.current_year and month and month > self.current_month:
                     logging.info(f"跳过未来月份: {year}-{month}")
                     continue
 
-                total_pages = await self.fetch_pages(session, url)
-                if total_pages == 0:
+                yield year, month, url
+
+    async def _crawl_worker(self, session: aiohttp.ClientSession, jobs: asyncio.PriorityQueue,
+                            results: asyncio.Queue):
+        """工作协程：探测任务产出第一页并展开其余页面任务，成功的页面推送给消费者；按任务类型受阶段并发限制"""
+        while True:
+            _, _, kind, url, year, month, page = await jobs.get()
+            try:
+                async with self.phase_limits.get(kind) or nullcontext():
+                    if kind == 'probe':
+                        if (crawled := await self.probe_pages(session, url, year, month)) is not None:
+                            for p in range(2, (crawled.total_pages or 1) + 1):
+                                jobs.put_nowait((PRIORITY_PAGE, next(self._job_seq), 'page', url, year, month, p))
+                            await results.put(crawled)
+                    elif (crawled := await self.scrape_page(session, url, page, year, month)) is not None:
+                        await results.put(crawled)
+            except Exception as e:
+                logging.warning(f"任务处理失败: {url} 第{page or 0}页，错误: {str(e) or type(e).__name__}")
+                self.record_failure(kind, url, year, month, page, retryable=False)
+            finally:
+                jobs.task_done()
+
+    async def iter_time_range(self, session: aiohttp.ClientSession, start_year: int, end_year: int,
+                              start_month: int = None, end_month: int = None,
+                              resume: bool = False) -> AsyncIterator[CrawledPage]:
+        """流水线式爬取时间范围，按页产出解析结果
+
+        所有 (年份, 月份) 的探测任务和页面任务共用一个有界工作队列，
+        在途请求数由请求引擎的自适应并发控制，完成的页面立即交给调用方。
+        可重试的失败任务在队列清空后统一重试，4xx 和解析错误等不重试，最终失败的页面记入爬取清单。
+        resume 为真时根据爬取清单跳过已完成的页面，否则先清空所涉及单元的清单。
+        """
+        jobs = asyncio.PriorityQueue()
+        concurrency = self.engine.limiter.maximum
+        results = asyncio.Queue(maxsize=concurrency * 2)
+        self.failed_jobs = []
+
+        skipped_units = resumed_pages = 0
+        for year, month, url in self.iter_units(start_year, end_year, start_month, end_month):
+            if self.store and resume:
+                total_pages, done = self.store.completed_pages(year, month)
+                if 1 in done:
+                    remaining = [p for p in range(2, (total_pages or 1) + 1) if p not in done]
+                    if not remaining:
+                        skipped_units += 1
+                    for p in remaining:
+                        jobs.put_nowait((PRIORITY_PAGE, next(self._job_seq), 'page', url, year, month, p))
+                    resumed_pages += len(remaining)
                     continue
+            elif self.store:
+                self.store.reset_manifest(year, month)
+            jobs.put_nowait((PRIORITY_PROBE, next(self._job_seq), 'probe', url, year, month, None))
+        if resume:
+            logging.info(f"⏩ 断点续爬 | 跳过已完成单元: {skipped_units} 个 | 续爬页面: {resumed_pages} 个")
+
+        async def close_when_done():
+            await jobs.join()
+            for _ in range(FAILED_RETRY_ROUNDS):
+                retry_jobs = [job for job in self.failed_jobs if job[-1]]
+                if not retry_jobs:
+                    break
+                self.failed_jobs = [job for job in self.failed_jobs if not job[-1]]
+                logging.info(f"🔁 重新尝试失败任务: {len(retry_jobs)} 个")
+                for kind, url, year, month, page, _ in retry_jobs:
+                    priority = PRIORITY_PROBE if kind == 'probe' else PRIORITY_PAGE
+                    jobs.put_nowait((priority, next(self._job_seq), kind, url, year, month, page))
+                await jobs.join()
+
+            for kind, url, year, month, page, _ in self.failed_jobs:
+                logging.warning(f"❌ 最终失败: {url} {f'第{page}页' if page else '(首页)'}")
+                if self.store:
+                    self.store.mark_page(year, month, page or 1, 'failed')
+            await results.put(None)
+
+        workers = [asyncio.create_task(self._crawl_worker(session, jobs, results))
+                   for _ in range(concurrency)]
+        closer = asyncio.create_task(close_when_done())
+        try:
+            while (crawled := await results.get()) is not None:
+                yield crawled
+        finally:
+            for task in (*workers, closer):
+                task.cancel()
+            await asyncio.gather(*workers, closer, return_exceptions=True)
 
-                tasks = [self.scrape_page(session, url, p, year, month)
-                         for p in range(1, total_pages + 1)]
-                results = await asyncio.gather(*tasks)
-                all_data.extend(
-                    [item for sublist in results for item in sublist])
-
-        return all_data
-
-    def generate_markdown(self, new_data: List[Dict], filename: str = "Bangumi_Anime.md"):
-        """生成或更新Markdown报告"""
-        # 合并现有数据
-        existing_data = self.parse_existing_markdown(
-            filename) if os.path.exists(filename) else []
-
-        # 记录新数据的统计信息
-        new_items_count = 0
-        new_years_data = defaultdict(int)
-
-        # 合并数据并跟踪新增条目
-        merged_data = []
-        seen = set()
-
-        # 处理现有数据
-        for item in existing_data:
-            identifier = (
-                item.get('year'),
-                item.get('title'),
-                item.get('episodes'),
-                item.get('url', '').split('/')[-1] if item.get('url') else ''
-            )
-            if identifier not in seen:
-                seen.add(identifier)
-                merged_data.append(item)
-
-        # 处理新数据
-        for item in new_data:
-            identifier = (
-                item.get('year'),
-                item.get('title'),
-                item.get('episodes'),
-                item.get('url', '').split('/')[-1] if item.get('url') else ''
-            )
-            if identifier not in seen:
-                seen.add(identifier)
-                new_items_count += 1
-                new_years_data[item.get('year')] += 1
-                merged_data.append({
-                    'year': item.get('year', 0),
-                    'month': item.get('month', 0),
-                    'day': item.get('day', 0),
-                    'cover': item.get('cover', ''),
-                    'title': item.get('title', ''),
-                    'url': item.get('url', ''),
-                    'jp_title': item.get('jp_title', ''),
-                    'episodes': item.get('episodes', '未知'),
-                    'score': item.get('score', '-'),
-                    'votes': item.get('votes', '0')
-                })
-
-        # 按年份分组
-        year_dict = defaultdict(list)
-        for item in merged_data:
-            year = item.get('year', '未知')
-            year_dict[year].append(item)
-
-        # 创建目录结构
-        md_content = "# Bangumi番剧数据报告\n\n## 目录\n"
-        sorted_years = sorted(year_dict.keys(),
-                              key=lambda y: int(y) if str(y).isdigit() else 0,
-                              reverse=True)
-
-        # 生成目录
-        for year in sorted_years:
-            md_content += f"- [{year}年](#{year}年)\n"
-        md_content += "\n"
-
-        # 生成详细内容
-        for year in sorted_years:
-            md_content += f"## {year}年\n\n"
-            md_content += "| 放送日期 | 封面 | 中文标题 | 日文标题 | 话数 | 评分 | 评分人数 |\n"
-            md_content += "| --- | --- | --- | --- | --- | --- | --- |\n"
-
-            # 按日期排序
-            sorted_items = sorted(
-                year_dict[year],
-                key=lambda x: (-x['year'], -
-                x.get('month', 0), -x.get('day', 0))
-            )
-
-            # 生成表格行
-            for item in sorted_items:
-                # 日期格式化
-                date_parts = []
-                if item.get('year'):
-                    date_parts.append(f"{item['year']}")
-                    if item.get('month') and item['month'] > 0:  # 确保月份有效
-                        date_parts.append(f"{item['month']:02d}")
-                        if item.get('day') and item['day'] > 0:  # 确保日期有效
-                            date_parts.append(f"{item['day']:02d}")
-                date_str = "-".join(date_parts) if date_parts else "未知"
-
-                # 封面处理
-                cover = f"![]({item['cover']})" if item.get('cover') else ""
-
-                # 标题链接
-                ch_title = item.get('title', '未知标题').strip()
-                title_link = f"[{ch_title}]({item.get('url', '')})" if item.get(
-                    'url') else ch_title
-
-                # 日文标题处理
-                jp_title = item.get('jp_title', '').strip()
-
-                # 评分人数处理
-                votes = re.sub(r'\D', '', item.get('votes', '0'))  # 提取纯数字
-                votes = votes if votes else '0'
-
-                md_content += f"| {date_str} | {cover} | {title_link} | {jp_title} | " \
-                              f"{item.get('episodes', '未知')} | {item.get('score', '-')} | " \
-                              f"{votes} |\n"
-            md_content += "\n"
-
-        # 输出统计信息
+    async def scrape_time_range(self, session: aiohttp.ClientSession, start_year: int, end_year: int,
+                                start_month: int = None, end_month: int = None,
+                                resume: bool = False) -> Tuple[int, int, int]:
+        """爬取时间范围并逐页写入存储，返回 (新增, 更新, 未变化) 条数
+
+        每页先合并入库再在爬取清单中标记完成，中断时已完成的页面不会丢失，内存占用与爬取范围无关。
+        合并后记录页面指纹；指纹未变化的页面已跳过解析，这里也不再合并，其条目全部计为未变化。
+        """
+        inserted = updated = unchanged = skipped_pages = 0
+        async for crawled in self.iter_time_range(session, start_year, end_year, start_month, end_month, resume):
+            with self.metrics.stage('merge'):
+                if crawled.unchanged:
+                    skipped_pages += 1
+                    unchanged += crawled.skipped_items
+                    self.store.mark_page(crawled.year, crawled.month, crawled.page, 'done',
+                                         crawled.total_pages, crawled.skipped_items)
+                    continue
+                result = self.store.upsert(crawled.items)
+                self.store.mark_page(crawled.year, crawled.month, crawled.page, 'done',
+                                     crawled.total_pages, len(crawled.items))
+                self.store.save_fingerprint(crawled.year, crawled.month, crawled.page, crawled.fingerprint,
+                                            crawled.total_pages, len(crawled.items))
+            inserted += len(result.inserted)
+            updated += len(result.updated)
+            unchanged += result.unchanged
+        if skipped_pages:
+            logging.info(f"🧬 页面指纹未变化，跳过解析与合并: {skipped_pages} 页")
+        return inserted, updated, unchanged
+
+    async def run_worker(self, session: aiohttp.ClientSession, queue: ShardQueue, worker_id: str) -> int:
+        """工作进程：循环领取分片并爬取，直到没有可领取的分片，返回完成的分片数
+
+        分片结果只写入 spool 目录，不访问主数据库；爬取期间定期续租。
+        有页面最终失败、或产出的页数少于首页给出的总页数时，分片放回队列，由之后的领取重试。
+        """
+        completed = 0
+        while (shard := queue.claim(worker_id)) is not None:
+            year, month = shard
+            logging.info(f"🧩 领取分片: {year}{f'-{month:02d}' if month else ''} | 工作进程: {worker_id}")
+
+            async def keep_lease():
+                while True:
+                    await asyncio.sleep(queue.lease / 3)
+                    queue.renew(year, month, worker_id)
+
+            renewer = asyncio.create_task(keep_lease())
+            items: List[AnimeRecord] = []
+            pages, total_pages = set(), None
+            try:
+                async for crawled in self.iter_time_range(session, year, year, month, month):
+                    items.extend(crawled.items)
+                    pages.add(crawled.page)
+                    if crawled.page == 1:
+                        total_pages = crawled.total_pages or 1
+            finally:
+                renewer.cancel()
+                await asyncio.gather(renewer, return_exceptions=True)
+
+            if self.failed_jobs or total_pages is None or len(pages) < total_pages:
+                logging.warning(f"❌ 分片未完整爬取: {year}{f'-{month:02d}' if month else ''} | "
+                                f"页数: {len(pages)}/{total_pages or '?'} | 失败任务: {len(self.failed_jobs)} 个")
+                queue.fail(year, month)
+                self.metrics.inc('shards_total', result='failed')
+                continue
+            queue.complete(year, month, items)
+            self.metrics.inc('shards_total', result='done')
+            completed += 1
+        logging.info(f"✅ 工作进程完成 | 分片: {completed} 个 | 工作进程: {worker_id}")
+        return completed
+
+    @staticmethod
+    def worker_command(args: argparse.Namespace, worker_id: str) -> List[str]:
+        """启动本地工作进程的命令行，沿用协调者的完整爬取配置和缓存参数
+
+        并行度来自多个工作进程，因此工作进程内部直接解析页面，不再各自创建进程池；
+        每小时请求预算由本地工作进程平分，合计不超过协调者的 --request-budget。
+        """
+        config = replace(ScraperConfig.from_args(args), parse_executor='inline', parse_workers=None)
+        if config.request_budget and args.workers:
+            config.request_budget = max(1, config.request_budget // args.workers)
+        command = [sys.executable, os.path.abspath(__file__), 'worker', '--spool', args.spool, '--worker-id', worker_id,
+                   *config.to_argv(),
+                   '--cache-dir', args.cache_dir, '--cache-ttl', args.cache_ttl, '--cache-max-mb', str(args.cache_max_mb)]
+        if args.replay:
+            command += ['--replay', args.replay]
+        elif args.no_cache:
+            command.append('--no-cache')
+        return command
+
+    async def run_coordinator(self, args: argparse.Namespace, queue: ShardQueue, start_year: int, end_year: int,
+                              start_month: int = None, end_month: int = None):
+        """协调者：将时间范围拆分为 (年份, 月份) 分片写入队列，启动本地工作进程并等待所有分片处理完毕
+
+        共享 spool 目录的其他主机上的工作进程也可以同时领取分片；--workers 0 时只等待外部工作进程。
+        工作进程崩溃留下的分片在租约过期后由新一轮工作进程重新领取。
+        """
+        units = [(year, month) for year, month, _ in self.iter_units(start_year, end_year, start_month, end_month)]
+        planned = queue.plan(units, reset=not args.resume)
+        logging.info(f"🧭 分片计划 | 分片: {planned} 个 | 本地工作进程: {args.workers} | 目录: {queue.spool_dir}")
+
+        host = socket.gethostname()
+        round_no = 0
+        while True:
+            if args.workers and queue.claimable():
+                round_no += 1
+                procs = [await asyncio.create_subprocess_exec(
+                    *self.worker_command(args, f"{host}-{round_no}-{i}")) for i in range(args.workers)]
+                try:
+                    codes = await asyncio.gather(*(proc.wait() for proc in procs))
+                finally:
+                    for proc in procs:
+                        if proc.returncode is None:
+                            proc.terminate()
+                            await proc.wait()
+                if all(codes):
+                    raise RuntimeError(f"本地工作进程全部异常退出，退出码: {codes}")
+            queue.expire()
+            counts = queue.counts()
+            if not counts.get('pending') and not counts.get('claimed'):
+                break
+            await asyncio.sleep(SHARD_POLL_INTERVAL)
+
+        logging.info(f"🧭 分片处理完毕 | 完成: {counts.get('done', 0)} 个 | 失败: {counts.get('failed', 0)} 个")
+
+    def merge_shards(self, queue: ShardQueue) -> Tuple[int, int, int]:
+        """按年份、月份顺序将已完成的分片结果合并入库，返回 (新增, 更新, 未变化) 条数"""
+        inserted = updated = unchanged = merged = 0
+        for year, month, records in queue.iter_results():
+            result = self.store.upsert(records)
+            queue.mark_merged(year, month)
+            inserted += len(result.inserted)
+            updated += len(result.updated)
+            unchanged += result.unchanged
+            merged += 1
+        logging.info(f"🧩 合并分片结果: {merged} 个")
+        return inserted, updated, unchanged
+
+    async def run_daemon(self, session: aiohttp.ClientSession, args: argparse.Namespace, output_file: str) -> int:
+        """常驻更新：按优先级循环刷新到期的单元，返回刷新的单元数
+
+        请求受每小时预算限制（请求引擎中的 RequestBudget），预估页数超出剩余预算的单元等待预算恢复后再刷新；
+        发出的请求时间保存在数据存储中，启动时载入，--once 由 cron 反复启动时也不会超出预算。
+        数据有变化时按 --publish-interval 节流重新生成报告并执行发布命令，没有变化时不发布；
+        收到 SIGTERM 或中断时立即停止刷新（包括等待预算中的请求），发布尚未发布的变化后退出。
+        --once 时刷新完当前到期的单元（或预算用尽）即退出。
+        """
+        scheduler = RefreshScheduler(self.store, args.since_year)
+        budget = self.engine.budget
+        refreshed = 0
+        dirty = False  # 有尚未发布的变化；刷新中途停止时已合并的页面可能有变化，也视为有变化
+        stopping = False
+        if budget:
+            budget.restore(self.store.recent_requests(time.time() - budget.window))
+
+        def save_budget():
+            if budget:
+                self.store.log_requests(budget.drain(), time.time() - budget.window)
+
+        async def refresh_loop():
+            nonlocal refreshed, dirty
+            # 发布间隔从启动时开始计算；--once 只在退出时发布一次
+            published_at = time.monotonic()
+            while True:
+                if dirty and not args.once and time.monotonic() - published_at >= args.publish_interval:
+                    await self.publish(session, args, output_file)
+                    dirty, published_at = False, time.monotonic()
+
+                unit, wait = scheduler.next_due(time.time())
+                if unit is None:
+                    if args.once:
+                        return
+                    logging.info(f"💤 暂无到期单元，{wait:.0f} 秒后下一个单元到期")
+                    await asyncio.sleep(min(wait, DAEMON_MAX_SLEEP))
+                    continue
+                if budget and (wait := budget.wait_time(unit.pages)) > 0:
+                    if args.once:
+                        logging.info(f"💤 本小时请求预算不足（{unit.label} 预计 {unit.pages} 页），留待下次运行")
+                        return
+                    logging.info(f"💤 本小时请求预算不足（{unit.label} 预计 {unit.pages} 页），{wait:.0f} 秒后继续")
+                    await asyncio.sleep(min(wait, DAEMON_MAX_SLEEP))
+                    continue
+
+                pending, dirty = dirty, True
+                with self.metrics.stage('crawl'):
+                    inserted, updated, _ = await self.scrape_time_range(
+                        session, unit.year, unit.year, unit.month, unit.month)
+                changed = inserted + updated
+                dirty = pending or changed > 0
+                failed = bool(self.failed_jobs)
+                pages = self.store.completed_pages(unit.year, unit.month)[0] or unit.pages
+                interval = scheduler.record(unit, changed, pages, time.time(), failed)
+                self.metrics.inc('refresh_units_total', tier=unit.tier,
+                                 result='failed' if failed else 'changed' if changed else 'unchanged')
+                logging.info(f"🔄 刷新 {unit.label}（{unit.tier}）| 新增: {inserted} | 更新: {updated} | "
+                             f"页数: {pages} | 下次刷新: {interval / 3600:.1f} 小时后")
+                refreshed += 1
+                save_budget()
+
+        def stop():
+            nonlocal stopping
+            stopping = True
+            task.cancel()
+
+        logging.info(f"🔄 常驻更新启动 | 起始年份: {args.since_year} | "
+                     f"请求预算: {f'{budget.limit}/小时（已用 {len(budget.sent)}）' if budget else '不限'} | "
+                     f"发布间隔: {args.publish_interval:.0f} 秒")
+        loop = asyncio.get_running_loop()
+        task = asyncio.create_task(refresh_loop())
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(signal.SIGTERM, stop)
+        try:
+            await task
+        except asyncio.CancelledError:
+            if not stopping:
+                raise
+            logging.info("🛑 收到停止信号，停止刷新")
+        finally:
+            with suppress(NotImplementedError):
+                loop.remove_signal_handler(signal.SIGTERM)
+            try:
+                if dirty:
+                    await self.publish(session, args, output_file)
+            finally:
+                save_budget()
+        logging.info(f"🔄 常驻更新结束 | 刷新单元: {refreshed} 个")
+        return refreshed
+
+    async def publish(self, session: aiohttp.ClientSession, args: argparse.Namespace, output_file: str):
+        """数据有变化后按参数补全详情、镜像封面，重新生成报告、统计和导出；报告文件有变化时执行发布命令"""
+        if args.enrich:
+            with self.metrics.stage('enrich'):
+                await self.enrich(session, args.enrich_ttl, limit=args.enrich_limit)
+        if args.mirror_covers:
+            with self.metrics.stage('covers'):
+                await self.mirror_covers(session, CoverMirror(args.cover_dir, args.thumb_dir), args.cover_limit)
+        changed = self.write_report(output_file)
+        if not args.no_stats:
+            with self.metrics.stage('stats'):
+                self.write_stats(args)
+        if args.export:
+            with self.metrics.stage('export'):
+                self.export_dataset(args)
+        if not changed:
+            logging.info("📣 报告内容未变化，跳过发布")
+        elif args.publish_command:
+            proc = await asyncio.create_subprocess_shell(args.publish_command)
+            code = await proc.wait()
+            if code:
+                logging.warning(f"⚠️ 发布命令失败，退出码: {code}")
+            else:
+                logging.info("📣 发布命令已执行")
+
+    async def fetch_subject_detail(self, session: aiohttp.ClientSession, subject_id: int,
+                                   year: int = None) -> Optional[SubjectDetail]:
+        """获取并解析条目详情页（使用详情页缓存）；离线模式缓存未命中时返回 None"""
+        body = await self.fetch_html(session, f"{BASE_URL}/subject/{subject_id}", year, self.detail_cache)
+        if body is None:
+            return None
+        started = time.perf_counter()
+        if self.executor is None:
+            detail = parse_subject_page(subject_id, body)
+        else:
+            loop = asyncio.get_running_loop()
+            detail = await loop.run_in_executor(self.executor, parse_subject_page, subject_id, body)
+        self.metrics.observe('detail_parse_seconds', time.perf_counter() - started)
+        return detail
+
+    async def enrich(self, session: aiohttp.ClientSession, ttl_days: float = DEFAULT_ENRICH_TTL_DAYS,
+                     concurrency: int = None, limit: int = None) -> int:
+        """补全条目详情（制作公司、标签、完整放送日期、排名），返回本次补全的条目数
+
+        工作协程数即详情阶段的并发数（默认取配置的 detail_concurrency），请求仍经过共享的请求引擎限速；每 ENRICH_CHECKPOINT_SIZE
+        个条目写入一次数据库，中断时也会写入已完成的部分，再次运行时跳过已补全的条目。
+        """
+        concurrency = concurrency or self.config.detail_concurrency
+        pending = self.store.pending_enrichment(ttl_days * 86400, limit)
+        if not pending:
+            logging.info("🔎 没有需要补全详情的条目")
+            return 0
+        logging.info(f"🔎 开始补全条目详情 | 待补全: {len(pending)} 条 | 并发: {concurrency}")
+
+        queue = asyncio.Queue()
+        for item in pending:
+            queue.put_nowait(item)
+        finished: List[SubjectDetail] = []
+        saved = failed = 0
+
+        def checkpoint():
+            nonlocal saved
+            self.store.save_details(finished)
+            saved += len(finished)
+            finished.clear()
+
+        async def worker():
+            nonlocal failed
+            while not queue.empty():
+                subject_id, year = queue.get_nowait()
+                try:
+                    detail = await self.fetch_subject_detail(session, subject_id, year)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if not (isinstance(e, aiohttp.ClientResponseError) and e.status == 404):
+                        logging.info(f"条目详情获取失败: {subject_id}，错误: {str(e) or type(e).__name__}")
+                        failed += 1
+                        continue
+                    # 条目已删除或不可见：记录空详情，在有效期内不再重复请求
+                    detail = SubjectDetail(subject_id)
+                if detail is None:
+                    continue
+                finished.append(detail)
+                if len(finished) >= ENRICH_CHECKPOINT_SIZE:
+                    checkpoint()
+                    logging.info(f"🔎 详情补全进度: {saved}/{len(pending)}")
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(pending))))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            checkpoint()
+        logging.info(f"✅ 条目详情补全完成 | 成功: {saved} 条 | 失败: {failed} 条")
+        return saved
+
+    async def mirror_covers(self, session: aiohttp.ClientSession, mirror: CoverMirror, limit: int = None) -> int:
+        """将尚未镜像的封面下载到本地内容寻址存储并生成缩略图，返回本次镜像的封面数
+
+        下载经过共享的请求引擎（按主机限速、自适应并发），并受封面阶段的并发数限制；
+        缩略图在解析执行器中生成。镜像索引每 COVER_CHECKPOINT_SIZE 个封面写入一次，中断后再次运行时继续。
+        """
+        if self.cache and self.cache.offline:
+            logging.info("🖼️ 离线模式不镜像封面")
+            return 0
+        pending = self.store.pending_covers(limit, thumbnails=mirror.thumbnails)
+        if not pending:
+            logging.info("🖼️ 没有需要镜像的封面")
+            return 0
+        if not mirror.thumbnails:
+            logging.warning("⚠️ 未安装 Pillow，只镜像原图，不生成缩略图")
+        logging.info(f"🖼️ 开始镜像封面 | 待下载: {len(pending)} 个 | 并发: {self.config.cover_concurrency or '共享上限'}")
+
+        queue = asyncio.Queue()
+        for url in pending:
+            queue.put_nowait(url)
+        finished: List[Tuple[str, Optional[str], Optional[str], int]] = []
+        saved = failed = 0
+
+        def checkpoint():
+            nonlocal saved
+            self.store.save_covers(finished)
+            saved += len(finished)
+            finished.clear()
+
+        async def worker():
+            nonlocal failed
+            while not queue.empty():
+                url = queue.get_nowait()
+                try:
+                    async with self.phase_limits.get('cover') or nullcontext():
+                        _, _, body = await self.engine.request(session, url, HEADERS)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if not (isinstance(e, aiohttp.ClientResponseError) and e.status in (403, 404, 410)):
+                        logging.info(f"封面下载失败: {url}，错误: {str(e) or type(e).__name__}")
+                        self.metrics.inc('covers_total', result='failed')
+                        failed += 1
+                        continue
+                    # 源站已没有该图片：记入索引，不再重复请求
+                    self.metrics.inc('covers_total', result='missing')
+                    finished.append((url, None, None, 0))
+                    continue
+
+                digest, new = mirror.save(body)
+                self.metrics.inc('covers_total', result='mirrored' if new else 'duplicate')
+                # 缩略图为空字符串表示图片无法解码，不再重试；为 None 表示未生成（未安装 Pillow）
+                thumb = None
+                if mirror.thumbnails:
+                    if mirror.has_thumbnail(digest):
+                        thumb = mirror.thumb_path(digest)
+                    else:
+                        if self.executor is None:
+                            data = make_thumbnail(body)
+                        else:
+                            loop = asyncio.get_running_loop()
+                            data = await loop.run_in_executor(self.executor, make_thumbnail, body)
+                        thumb = mirror.save_thumbnail(digest, data) if data else ''
+                finished.append((url, digest, thumb, len(body)))
+                if len(finished) >= COVER_CHECKPOINT_SIZE:
+                    checkpoint()
+                    logging.info(f"🖼️ 封面镜像进度: {saved}/{len(pending)}")
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(self.engine.limiter.maximum, len(pending))))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            checkpoint()
+        logging.info(f"✅ 封面镜像完成 | 成功: {saved} 个 | 失败: {failed} 个 | 目录: {mirror.cover_dir}")
+        return saved
+
+    def load_store(self, db_path: str, report_path: str) -> AnimeStore:
+        """打开数据存储；首次使用时从现有 Markdown 报告（单文件或分片目录）导入历史数据"""
+        self.store = AnimeStore(db_path)
+        if self.store.count() == 0 and os.path.exists(report_path):
+            logging.info(f"📦 数据库为空，从现有报告导入: {report_path}")
+            inserted = 0
+            with self.metrics.stage('import'):
+                for markdown_file in self.report_files(report_path):
+                    inserted += len(self.store.upsert(self.parse_existing_markdown(markdown_file)).inserted)
+            logging.info(f"📦 导入完成 | 条目数: {inserted}")
+        return self.store
+
+    @staticmethod
+    def report_files(report_path: str) -> List[str]:
+        """列出报告包含的 Markdown 文件，分片按年份倒序"""
+        if not os.path.isdir(report_path):
+            return [report_path]
+        shards = [name for name in os.listdir(report_path) if SHARD_FILE_PATTERN.fullmatch(name)]
+        shards.sort(key=lambda name: int(SHARD_FILE_PATTERN.fullmatch(name).group(1)), reverse=True)
+        return [os.path.join(report_path, name) for name in shards]
+
+    def generate_markdown(self, new_data: List[AnimeRecord], filename: str = DEFAULT_OUTPUT_FILE):
+        """将新数据写入存储，并由存储重新生成Markdown报告"""
+        existing_count = self.store.count()
+        first_new_seq = self.store.next_seq
+        with self.metrics.stage('merge'):
+            result = self.store.upsert(new_data)
+        self.log_merge_summary(existing_count, first_new_seq,
+                               len(result.inserted), len(result.updated), result.unchanged)
+        self.write_report(filename)
+
+    def log_merge_summary(self, existing_count: int, first_new_seq: int, inserted: int, updated: int,
+                          unchanged: int):
+        """输出合并统计，first_new_seq 之后写入的条目按年份汇总"""
         logging.info("✅ 数据合并完成:")
-        logging.info(f"   - 现有数据: {len(existing_data)} 条")
-        logging.info(f"   - 本次新增: {new_items_count} 条")
+        logging.info(f"   - 现有数据: {existing_count} 条")
+        logging.info(f"   - 本次新增: {inserted} 条")
+        logging.info(f"   - 本次更新: {updated} 条")
+        logging.info(f"   - 未变化: {unchanged} 条")
+        logging.info(f"   - 评分历史新增观测点: {self.store.history_appended} 个")
 
         # 按年份显示新增数据统计
-        if new_items_count > 0:
+        if inserted > 0:
             logging.info("   - 新增数据年份分布:")
-            for year, count in sorted(new_years_data.items(), reverse=True):
+            for year, count in self.store.count_by_year(since_seq=first_new_seq):
                 logging.info(f"     * {year}年: {count} 条")
 
-        # 写入文件
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(md_content)
+    def write_report(self, filename: str) -> bool:
+        """按输出模式由存储生成报告，返回报告文件是否有变化（单文件模式总是重写，视为有变化）"""
+        with self.metrics.stage('render'):
+            if self.output_mode == 'sharded':
+                changed = self.write_shards(filename)
+            else:
+                self.write_markdown(filename)
+                changed = True
         logging.info(f"📝 报告已保存至: {os.path.abspath(filename)}")
+        return changed
+
+    def write_markdown(self, filename: str):
+        """由存储流式生成Markdown报告，逐年写入缓冲文件，完成后原子替换"""
+        covers = self.cover_links(os.path.dirname(os.path.abspath(filename)))
+        with atomic_write(filename) as f:
+            # 创建目录结构
+            f.write("# Bangumi番剧数据报告\n\n## 目录\n")
+            f.writelines(f"- [{year}年](#{year}年)\n" for year in self.store.years())
+            f.write("\n")
+
+            # 存储已按放送日期倒序输出，按年份分组即可逐段写入
+            for year, items in itertools.groupby(self.store.iter_records(), key=attrgetter('year')):
+                f.write(f"## {year}年\n\n")
+                f.write(MARKDOWN_TABLE_HEADER)
+                f.writelines(self.iter_markdown_rows(items, covers))
+                f.write("\n")
+
+    def write_shards(self, directory: str) -> bool:
+        """按年份分片生成报告及目录索引，只重写内容哈希发生变化的文件；返回是否有文件被重写或删除"""
+        os.makedirs(directory, exist_ok=True)
+        covers = self.cover_links(directory)
+        year_counts = []
+        rewritten = 0
+
+        for year, items in itertools.groupby(self.store.iter_records(), key=attrgetter('year')):
+            rows = list(self.iter_markdown_rows(items, covers))
+            year_counts.append((year, len(rows)))
+            content = f"# {year}年\n\n[返回目录]({SHARD_INDEX_FILE})\n\n{MARKDOWN_TABLE_HEADER}{''.join(rows)}"
+            rewritten += write_if_changed(os.path.join(directory, f"{year}.md"), content)
+
+        index = "# Bangumi番剧数据报告\n\n## 目录\n" + \
+                "".join(f"- [{year}年]({year}.md)（{count} 部）\n" for year, count in year_counts)
+        rewritten += write_if_changed(os.path.join(directory, SHARD_INDEX_FILE), index)
+
+        # 清理已没有数据的年份分片
+        years = {str(year) for year, _ in year_counts}
+        removed = 0
+        for name in os.listdir(directory):
+            if (match := SHARD_FILE_PATTERN.fullmatch(name)) and match.group(1) not in years:
+                os.remove(os.path.join(directory, name))
+                removed += 1
+
+        logging.info(f"🗂️ 分片报告: {len(year_counts)} 个年份 | 重写 {rewritten} 个文件 | "
+                     f"未变化 {len(year_counts) + 1 - rewritten} 个 | 删除 {removed} 个")
+        return bool(rewritten or removed)
+
+    def cover_links(self, report_dir: str) -> Dict[str, str]:
+        """封面 URL → 相对报告目录的本地缩略图路径；未启用本地封面（--local-covers）时为空"""
+        if not self.thumb_dir:
+            return {}
+        prefix = os.path.relpath(os.path.abspath(self.thumb_dir), report_dir).replace(os.sep, '/')
+        return {url: f"{prefix}/{thumb}" for url, thumb in self.store.cover_thumbnails().items()}
 
-    def parse_existing_markdown(self, filename: str) -> List[Dict]:
+    @staticmethod
+    def iter_markdown_rows(records: Iterator[AnimeRecord], covers: Dict[str, str] = None) -> Iterator[str]:
+        """逐条生成表格行，covers 中有本地缩略图的封面引用本地文件"""
+        covers = covers or {}
+        for item in records:
+            date_str = item.date_label
+
+            # 封面处理
+            cover_url = covers.get(item.cover, item.cover)
+            cover = f"![]({cover_url})" if cover_url else ""
+
+            episodes = item.episodes if item.episodes is not None else '未知'
+            score = f"{item.score:.1f}" if item.score is not None else '-'
+
+            yield f"| {date_str} | {cover} | [{escape_markdown_cell(item.title)}]({item.url}) | " \
+                  f"{escape_markdown_cell(item.jp_title)} | " \
+                  f"{episodes} | {score} | {item.votes} |\n"
+
+    def parse_existing_markdown(self, filename: str) -> List[AnimeRecord]:
         """解析现有Markdown文件"""
         existing_data = []
         current_year = None
@@ -373,14 +2962,14 @@ class BangumiScraper:
                     line = line.strip()
 
                     # 匹配年份标题
-                    if line.startswith('## '):
-                        year_match = re.match(r'## (\d+)年', line)
+                    if line.startswith('#'):
+                        year_match = re.match(r'#{1,2} (\d+)年', line)
                         if year_match:
                             current_year = int(year_match.group(1))
 
                     # 匹配表格行
                     elif line.startswith('|') and not line.startswith(('| ---', '| 放送日期')):
-                        parts = [p.strip() for p in line.split('|')[1:-1]]
+                        parts = split_markdown_row(line)
                         if len(parts) >= 6:
                             try:
                                 # 解析封面URL
@@ -395,26 +2984,28 @@ class BangumiScraper:
                                 title = parts[2]
                                 url = ''
                                 if '[' in parts[2] and '](' in parts[2]:
-                                    title_match = re.search(r'\[(.*?)\]', parts[2])
-                                    url_match = re.search(r'\]\((.*?)\)', parts[2])
+                                    title_match = re.search(r'\[(.*)\]', parts[2])
+                                    url_match = re.search(r'\]\(([^)]*)\)$', parts[2])
                                     if title_match:
                                         title = title_match.group(1)
                                     if url_match:
                                         url = url_match.group(1)
 
-                                # 初始化条目，确保有默认值
-                                item = {
-                                    'year': current_year,
-                                    'month': 0,
-                                    'day': 0,
-                                    'cover': cover,
-                                    'title': title,
-                                    'url': url,
-                                    'jp_title': parts[3],
-                                    'episodes': parts[4],
-                                    'score': parts[5],
-                                    'votes': parts[6] if len(parts) > 6 else '0'
-                                }
+                                # 初始化条目，确保有默认值；无法识别条目ID的行跳过并记录
+                                subject_id = AnimeRecord.parse_subject_id(url)
+                                if subject_id is None:
+                                    logging.warning(f"⚠️ 无法识别条目ID，跳过: {line[:80]}")
+                                    continue
+                                item = AnimeRecord(
+                                    subject_id,
+                                    title=title.strip(),
+                                    jp_title=parts[3],
+                                    cover=cover,
+                                    year=current_year or 0,
+                                    episodes=AnimeRecord.parse_episodes(parts[4]),
+                                    score=AnimeRecord.parse_score(parts[5]),
+                                    votes=AnimeRecord.parse_votes(parts[6] if len(parts) > 6 else '0')
+                                )
 
                                 # 解析日期（加强日期解析）
                                 date_str = parts[0]
@@ -424,25 +3015,25 @@ class BangumiScraper:
                                     if len(date_parts) >= 1:
                                         # 处理纯年份格式
                                         if date_parts[0].isdigit():
-                                            item['year'] = int(date_parts[0])
+                                            item.year = int(date_parts[0])
 
                                     if len(date_parts) >= 2:
                                         # 处理年-月格式
                                         if date_parts[1].isdigit():
-                                            item['month'] = int(date_parts[1])
+                                            item.month = int(date_parts[1])
 
                                     if len(date_parts) >= 3:
                                         # 处理年-月-日格式
                                         if date_parts[2].isdigit():
-                                            item['day'] = int(date_parts[2])
+                                            item.day = int(date_parts[2])
                                         # 处理可能含有括号的情况, 如 "25(美国)"
                                         elif '(' in date_parts[2]:
                                             day_part = date_parts[2].split('(')[0]
                                             if day_part.isdigit():
-                                                item['day'] = int(day_part)
+                                                item.day = int(day_part)
                                 except ValueError:
                                     # 如果日期解析失败，保留当前年份
-                                    item['year'] = current_year
+                                    item.year = current_year or 0
 
                                 existing_data.append(item)
                                 parsed_count += 1
@@ -458,99 +3049,414 @@ class BangumiScraper:
             return []
 
     @staticmethod
-    def merge_data(existing: List[Dict], new: List[Dict]) -> List[Dict]:
-        """合并并去重数据"""
-        seen = set()
-        merged = []
-
-        # 处理现有数据
-        for item in existing:
-            identifier = (
-                item.get('year'),
-                item.get('title'),
-                item.get('episodes'),
-                item.get('url', '').split('/')[-1] if item.get('url') else ''
-            )
-            if identifier not in seen:
-                seen.add(identifier)
-                merged.append(item)
-
-        # 处理新数据
-        for item in new:
-            identifier = (
-                item.get('year'),
-                item.get('title'),
-                item.get('episodes'),
-                item.get('url', '').split('/')[-1] if item.get('url') else ''
-            )
-            if identifier not in seen:
-                seen.add(identifier)
-                merged.append({
-                    'year': item.get('year', 0),
-                    'month': item.get('month', 0),
-                    'day': item.get('day', 0),
-                    'cover': item.get('cover', ''),
-                    'title': item.get('title', ''),
-                    'url': item.get('url', ''),
-                    'jp_title': item.get('jp_title', ''),
-                    'episodes': item.get('episodes', '未知'),
-                    'score': item.get('score', '-'),
-                    'votes': item.get('votes', '0')
-                })
-
-        return merged
+    def merge_data(existing: List[AnimeRecord], new: List[AnimeRecord]) -> List[AnimeRecord]:
+        """合并并去重数据：以条目ID为键，新数据覆盖旧数据，保持首次出现的顺序"""
+        engine = MergeEngine({item.subject_id: item for item in existing})
+        engine.merge(new)
+        return list(engine.index.values())
 
     async def main(self):
-        async with self:
-            parser = argparse.ArgumentParser(description='Bangumi Scraper')
-            subparsers = parser.add_subparsers(dest='mode', required=True)
-
-            # 交互模式
-            interactive_parser = subparsers.add_parser(
-                'interactive', help='Interactive mode for manual runs')
-
-            # 自动模式
-            auto_parser = subparsers.add_parser(
-                'auto', help='Automatic mode for CI/CD')
-            auto_parser.add_argument(
-                '--year', type=int, required=True, help='Target year')
-            auto_parser.add_argument('--month', type=int, help='Target month')
-            auto_parser.add_argument(
-                '--concurrent', type=int, default=3, help='Concurrent requests')
-
-            args = parser.parse_args()
-
-            if args.mode == 'auto':
-                # 自动模式逻辑
-                os.environ['CONCURRENT_REQUESTS'] = str(args.concurrent)
-                start_year = end_year = args.year
-                start_month = end_month = args.month
-                logging.info(f"🏃 自动模式启动 | 年份: {args.year} | 月份: {args.month or '全年'}")
-            else:
-                # 交互模式逻辑
-                year_input = input("请输入要爬取的年份（支持范围，如2010-2023）: ").strip()
-                start_year, end_year = self.process_year_input(year_input)
-
-                month_input = None
-                if start_year == end_year:
-                    month_input = input(
-                        "请输入月份（可选，支持范围，如4-7）: ").strip() or None
-
-                start_month, end_month = self.process_month_input(
-                    month_input) if month_input else (None, None)
+        parser = argparse.ArgumentParser(description='Bangumi Scraper')
+        subparsers = parser.add_subparsers(dest='mode', required=True)
+
+        # 数据存储参数
+        store_parser = argparse.ArgumentParser(add_help=False)
+        store_parser.add_argument(
+            '--db', default=DEFAULT_DB_FILE, help='SQLite data store path')
+
+        # 列式导出参数
+        export_parser = argparse.ArgumentParser(add_help=False)
+        export_parser.add_argument(
+            '--export-dir', default=DEFAULT_EXPORT_DIR, help='Columnar export directory (partitioned by year)')
+        export_parser.add_argument(
+            '--export-format', nargs='+', choices=EXPORT_FORMATS, default=list(EXPORT_FORMATS),
+            help='Export formats')
+        export_parser.add_argument(
+            '--export-full', action='store_true', help='Rewrite the whole export instead of appending changes')
+
+        # 统计报告参数
+        stats_parser = argparse.ArgumentParser(add_help=False)
+        stats_parser.add_argument(
+            '--stats-output', default=DEFAULT_STATS_FILE, help='Statistics and rankings Markdown report path')
+        stats_parser.add_argument(
+            '--stats-json', default=DEFAULT_STATS_JSON,
+            help='Statistics JSON path (also the baseline for the next run\'s trend deltas)')
+        stats_parser.add_argument(
+            '--top', type=int, default=DEFAULT_STATS_TOP, help='Entries in the vote-weighted ranking')
+
+        # 公共参数
+        common_parser = argparse.ArgumentParser(add_help=False, parents=[store_parser, export_parser, stats_parser])
+        common_parser.add_argument(
+            '--output-mode', choices=OUTPUT_MODES, default=DEFAULT_OUTPUT_MODE,
+            help='single: one Markdown file; sharded: one file per year plus an index')
+        common_parser.add_argument(
+            '--output', help=f'Report path (default: {DEFAULT_SHARD_DIR}/ when sharded, {DEFAULT_OUTPUT_FILE} when single)')
+        common_parser.add_argument(
+            '--cache-dir', default=DEFAULT_CACHE_DIR, help='HTTP cache directory')
+        common_parser.add_argument(
+            '--cache-ttl', default=DEFAULT_CACHE_TTL,
+            help='Cache TTL by airtime age, e.g. "0:3600,1:86400,10:inf" (years:seconds)')
+        common_parser.add_argument(
+            '--cache-max-mb', type=int, default=DEFAULT_CACHE_MAX_MB, help='HTTP cache size limit in MB')
+        common_parser.add_argument(
+            '--detail-cache-dir', default=DEFAULT_DETAIL_CACHE_DIR,
+            help='HTTP cache directory for subject detail pages (always revalidated)')
+        common_parser.add_argument(
+            '--detail-cache-max-mb', type=int, default=DEFAULT_DETAIL_CACHE_MAX_MB,
+            help='Detail page cache size limit in MB')
+        common_parser.add_argument(
+            '--no-cache', action='store_true', help='Disable the HTTP cache')
+        common_parser.add_argument(
+            '--parser', choices=PARSER_BACKENDS, default=DEFAULT_PARSER,
+            help='Listing page parser backend (lxml only parses the item list fragment)')
+        common_parser.add_argument(
+            '--concurrent', type=int, default=MAX_CONCURRENT,
+            help='Initial concurrent requests; adapts up to --max-concurrent while responses are healthy')
+        common_parser.add_argument(
+            '--max-concurrent', type=int, help='Adaptive concurrency ceiling (default: 4x --concurrent)')
+        common_parser.add_argument(
+            '--probe-concurrency', type=int, default=0, help='Concurrent page-count probes (0: no separate limit)')
+        common_parser.add_argument(
+            '--listing-concurrency', type=int, default=0, help='Concurrent listing page fetches (0: no separate limit)')
+        common_parser.add_argument(
+            '--detail-concurrency', '--enrich-concurrency', type=int, default=DEFAULT_ENRICH_CONCURRENCY,
+            help='Concurrent detail page requests')
+        common_parser.add_argument(
+            '--cover-concurrency', type=int, default=DEFAULT_COVER_CONCURRENCY,
+            help='Concurrent cover downloads (0: no separate limit)')
+        common_parser.add_argument(
+            '--keepalive-timeout', type=float, default=DEFAULT_KEEPALIVE_TIMEOUT,
+            help='Seconds to keep idle connections open for reuse')
+        common_parser.add_argument(
+            '--dns-cache-ttl', type=int, default=DEFAULT_DNS_CACHE_TTL, help='Seconds to cache DNS lookups')
+        common_parser.add_argument(
+            '--limit-per-host', type=int, default=0, help='Max open connections per host (0: no limit)')
+        common_parser.add_argument(
+            '--rate-limit', type=float, default=DEFAULT_RATE_LIMIT, help='Max requests per second per host')
+        common_parser.add_argument(
+            '--request-budget', type=int, default=0,
+            help=f'Max requests in any one hour, retries included (0: no limit; daemon default: {DEFAULT_REQUEST_BUDGET})')
+        common_parser.add_argument(
+            '--max-retries', type=int, default=DEFAULT_MAX_RETRIES, help='Retries per request on 429/5xx/network errors')
+        common_parser.add_argument(
+            '--parse-executor', choices=PARSE_EXECUTORS, default=DEFAULT_PARSE_EXECUTOR,
+            help='Where listing pages are parsed: process pool, thread pool or inline')
+        common_parser.add_argument(
+            '--parse-workers', type=int, help='Parse pool size (default: CPU count)')
+        common_parser.add_argument(
+            '--reparse', action='store_true',
+            help='Parse and merge every listing page even if its fingerprint is unchanged since the last run')
+        common_parser.add_argument(
+            '--replay', metavar='DIR', help='Offline mode: serve pages only from a cache/replay directory')
+        common_parser.add_argument(
+            '--metrics-json', metavar='PATH', help='Write the run metrics summary as JSON')
+        common_parser.add_argument(
+            '--metrics-prom', metavar='PATH', help='Write run metrics in Prometheus textfile format')
+        common_parser.add_argument(
+            '--mirror-covers', action='store_true',
+            help='Download covers into a local content-addressed store and make thumbnails (needs Pillow)')
+        common_parser.add_argument(
+            '--cover-dir', default=DEFAULT_COVER_DIR, help='Mirrored original covers, named by content hash')
+        common_parser.add_argument(
+            '--thumb-dir', default=DEFAULT_THUMB_DIR, help='Cover thumbnails referenced by the report')
+        common_parser.add_argument(
+            '--cover-limit', type=int, help='Max covers to download in this run')
+        common_parser.add_argument(
+            '--local-covers', action='store_true', help='Reference local thumbnails in the report where available')
+        common_parser.add_argument(
+            '--no-stats', action='store_true', help='Skip the statistics report generated with the Markdown report')
+        common_parser.add_argument(
+            '--export', action='store_true', help='Export new/updated records to Parquet/CSV after merging')
+        common_parser.add_argument(
+            '--resume', action='store_true',
+            help='Skip pages already completed by an interrupted run (from the crawl manifest)')
+        common_parser.add_argument(
+            '--enrich', action='store_true', help='Fetch subject detail pages after crawling (studio, tags, air date, rank)')
+        common_parser.add_argument(
+            '--enrich-ttl', type=float, default=DEFAULT_ENRICH_TTL_DAYS, help='Re-enrich subjects older than this many days')
+        common_parser.add_argument(
+            '--enrich-limit', type=int, help='Max subjects to enrich in this run')
+
+        # 交互模式
+        interactive_parser = subparsers.add_parser(
+            'interactive', parents=[common_parser], help='Interactive mode for manual runs')
+
+        # 自动模式
+        auto_parser = subparsers.add_parser(
+            'auto', parents=[common_parser], help='Automatic mode for CI/CD')
+        auto_parser.add_argument(
+            '--year', type=int, required=True, help='Target year')
+        auto_parser.add_argument('--month', type=int, help='Target month')
+
+        # 详情补全模式：只补全数据库中已有条目的详情，不爬取列表页
+        subparsers.add_parser(
+            'enrich', parents=[common_parser], help='Only enrich stored subjects from their detail pages')
+
+        # 封面镜像模式：只镜像数据库中已有条目的封面并重新生成报告，不爬取列表页
+        subparsers.add_parser(
+            'covers', parents=[common_parser], help='Only mirror covers of stored subjects and rewrite the report')
+
+        # 分布式爬取：协调者拆分分片并启动工作进程，工作进程领取分片，合并模式将分片结果合并入库
+        spool_parser = argparse.ArgumentParser(add_help=False)
+        spool_parser.add_argument(
+            '--spool', default=DEFAULT_SPOOL_DIR, help='Shared directory holding the shard queue and results')
+        coordinator_parser = subparsers.add_parser(
+            'coordinator', parents=[common_parser, spool_parser],
+            help='Split a crawl into shards, run local workers and merge their results')
+        coordinator_parser.add_argument('--year', required=True, help='Year or range, e.g. 2024 or 2000-2024')
+        coordinator_parser.add_argument('--month', help='Month or range, e.g. 4 or 4-6 (single year only)')
+        coordinator_parser.add_argument(
+            '--workers', type=int, default=DEFAULT_LOCAL_WORKERS,
+            help='Local worker processes (0: only wait for workers started elsewhere)')
+        worker_parser = subparsers.add_parser(
+            'worker', parents=[common_parser, spool_parser], help='Claim and crawl shards from a coordinator queue')
+        worker_parser.add_argument('--worker-id', help='Worker name recorded on claimed shards (default: host-pid)')
+        subparsers.add_parser(
+            'merge', parents=[common_parser, spool_parser],
+            help='Merge finished shard results into the data store and rewrite the report')
+
+        # 常驻更新模式：按放送时间分层、随变化率自适应的优先级调度，持续刷新并在数据变化时发布
+        daemon_parser = subparsers.add_parser(
+            'daemon', parents=[common_parser], help='Keep the dataset fresh with a prioritized refresh loop')
+        daemon_parser.add_argument(
+            '--since-year', type=int, default=DEFAULT_DAEMON_SINCE_YEAR, help='Oldest year kept fresh')
+        daemon_parser.add_argument(
+            '--publish-interval', type=float, default=DEFAULT_PUBLISH_INTERVAL,
+            help='Min seconds between report regenerations while data keeps changing')
+        daemon_parser.add_argument(
+            '--publish-command', help='Shell command run after the report files changed, e.g. a git commit/push script')
+        daemon_parser.add_argument(
+            '--once', action='store_true', help='Refresh the units that are due now, publish and exit')
+        # 刷新计划决定何时重新访问页面，缓存页面每次都用条件请求重新验证
+        daemon_parser.set_defaults(request_budget=DEFAULT_REQUEST_BUDGET, cache_ttl='0:0')
+
+        # 查询模式：只读取数据库，不发起网络请求
+        query_parser = subparsers.add_parser(
+            'query', parents=[store_parser], help='Search the collected dataset')
+        query_parser.add_argument('--year', help='Year or range, e.g. 2024 or 2010-2020')
+        query_parser.add_argument('--month', help='Month or range, e.g. 4 or 4-6')
+        query_parser.add_argument('--min-score', type=float, help='Minimum score')
+        query_parser.add_argument('--min-votes', type=int, help='Minimum number of votes')
+        query_parser.add_argument('--title', help='Substring of the Chinese or Japanese title')
+        query_parser.add_argument('--sort', choices=list(QUERY_ORDERS), default='date', help='Result order')
+        query_parser.add_argument(
+            '--limit', type=int, default=DEFAULT_QUERY_LIMIT, help='Max results (0: no limit)')
+        query_parser.add_argument(
+            '--format', choices=('table', 'json'), default='table', help='Markdown table rows or JSON lines')
+
+        # 评分历史模式：只读取数据库中条目或某一季度的评分、评分人数变化轨迹
+        history_parser = subparsers.add_parser(
+            'history', parents=[store_parser], help='Show score and vote history of subjects or a season')
+        history_parser.add_argument('subjects', nargs='*', type=int, help='Subject ids')
+        history_parser.add_argument('--year', type=int, help='Air year of the subjects (instead of subject ids)')
+        history_parser.add_argument(
+            '--season', type=int, choices=range(1, len(SEASONS) + 1),
+            help='Season of --year: 1 winter (Jan-Mar), 2 spring, 3 summer, 4 fall (default: whole year)')
+        history_parser.add_argument(
+            '--format', choices=('table', 'json'), default='table', help='Markdown table rows or JSON lines')
+
+        # 导出模式：只把数据库中的变化导出为列式数据集
+        subparsers.add_parser(
+            'export', parents=[store_parser, export_parser], help='Export the dataset to Parquet/CSV')
+
+        # 统计模式：只由数据库生成统计报告
+        subparsers.add_parser(
+            'stats', parents=[store_parser, stats_parser], help='Generate the statistics and rankings report')
+
+        args = parser.parse_args()
+
+        if args.mode == 'query':
+            return self.run_query(args)
+        if args.mode == 'history':
+            if bool(args.subjects) == bool(args.year):
+                history_parser.error('give either subject ids or --year')
+            return self.run_history(args)
+        if args.mode in ('export', 'stats'):
+            self.load_store(args.db, DEFAULT_SHARD_DIR)
+            try:
+                if args.mode == 'export':
+                    self.export_dataset(args)
+                else:
+                    self.write_stats(args)
+            finally:
+                self.store.close()
+            return
 
-            # 定义输出文件路径
-            output_file = "Bangumi_Anime.md"
-            # 确保文件路径是绝对路径
-            if not os.path.isabs(output_file):
-                output_file = os.path.abspath(output_file)
+        if args.mode in ('enrich', 'covers', 'worker', 'merge', 'daemon'):
+            start_year = end_year = start_month = end_month = None
+            logging.info({'enrich': "🔎 详情补全模式启动", 'covers': "🖼️ 封面镜像模式启动",
+                          'worker': "🧩 工作进程启动", 'merge': "🧩 分片合并模式启动",
+                          'daemon': "🔄 常驻更新模式启动"}[args.mode])
+        elif args.mode == 'coordinator':
+            start_year, end_year = self.process_year_input(args.year)
+            start_month, end_month = self.process_month_input(args.month) if args.month else (None, None)
+            logging.info(f"🧭 协调者启动 | 年份: {args.year} | 月份: {args.month or '全年'}")
+        elif args.mode == 'auto':
+            # 自动模式逻辑
+            start_year = end_year = args.year
+            start_month = end_month = args.month
+            logging.info(f"🏃 自动模式启动 | 年份: {args.year} | 月份: {args.month or '全年'}")
+        else:
+            # 交互模式逻辑
+            year_input = input("请输入要爬取的年份（支持范围，如2010-2023）: ").strip()
+            start_year, end_year = self.process_year_input(year_input)
+
+            month_input = None
+            if start_year == end_year:
+                month_input = input(
+                    "请输入月份（可选，支持范围，如4-7）: ").strip() or None
+
+            start_month, end_month = self.process_month_input(
+                month_input) if month_input else (None, None)
+
+        # 定义输出文件路径
+        self.output_mode = args.output_mode
+        output_file = args.output or (DEFAULT_SHARD_DIR if self.output_mode == 'sharded' else DEFAULT_OUTPUT_FILE)
+        # 确保文件路径是绝对路径
+        if not os.path.isabs(output_file):
+            output_file = os.path.abspath(output_file)
+
+        logging.info(f"📝 输出文件路径: {output_file}")
+        self.thumb_dir = args.thumb_dir if args.local_covers else None
+        self.config = ScraperConfig.from_args(args)
+        logging.info(f"⚙️ 并发: {self.config.concurrency}（上限 {self.config.max_concurrency}）"
+                     f" | 详情并发: {self.config.detail_concurrency} | 限速: {self.config.rate_limit}/秒")
 
-            logging.info(f"📝 输出文件路径: {output_file}")
+        async with self:
+            # 工作进程只把分片结果写入 spool 目录，不打开主数据库
+            if args.mode != 'worker':
+                self.load_store(args.db, output_file)
+            if args.replay:
+                self.cache = self.detail_cache = HttpCache(args.replay, args.cache_ttl, args.cache_max_mb, offline=True)
+                logging.info(f"📼 离线回放模式 | 目录: {args.replay}")
+            elif not args.no_cache:
+                self.cache = HttpCache(args.cache_dir, args.cache_ttl, args.cache_max_mb)
+                if args.mode == 'enrich' or args.enrich:
+                    self.detail_cache = HttpCache(args.detail_cache_dir, DETAIL_CACHE_TTL, args.detail_cache_max_mb)
 
-            async with aiohttp.ClientSession(connector=self.connector) as session:
-                data = await self.scrape_time_range(session, start_year, end_year, start_month, end_month)
-                # 确保在自动模式下也能正确合并现有数据
-                self.generate_markdown(data, output_file)
+            try:
+                async with aiohttp.ClientSession(connector=self.connector) as session:
+                    if args.mode == 'worker':
+                        worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+                        queue = ShardQueue(args.spool)
+                        with self.metrics.stage('crawl'):
+                            await self.run_worker(session, queue, worker_id)
+                        queue.close()
+                        return
+                    if args.mode == 'daemon':
+                        await self.run_daemon(session, args, output_file)
+                        return
+                    if args.mode in ('coordinator', 'merge'):
+                        queue = ShardQueue(args.spool)
+                        if args.mode == 'coordinator':
+                            with self.metrics.stage('crawl'):
+                                await self.run_coordinator(args, queue, start_year, end_year, start_month, end_month)
+                        existing_count, first_new_seq = self.store.count(), self.store.next_seq
+                        with self.metrics.stage('merge'):
+                            merged = self.merge_shards(queue)
+                        queue.close()
+                        self.log_merge_summary(existing_count, first_new_seq, *merged)
+                    elif args.mode not in ('enrich', 'covers'):
+                        existing_count, first_new_seq = self.store.count(), self.store.next_seq
+                        with self.metrics.stage('crawl'):
+                            merged = await self.scrape_time_range(
+                                session, start_year, end_year, start_month, end_month, args.resume)
+                        self.log_merge_summary(existing_count, first_new_seq, *merged)
+                    if args.mode == 'covers' or args.mirror_covers:
+                        with self.metrics.stage('covers'):
+                            await self.mirror_covers(
+                                session, CoverMirror(args.cover_dir, args.thumb_dir), args.cover_limit)
+                    if args.mode != 'enrich':
+                        self.write_report(output_file)
+                        if not args.no_stats:
+                            with self.metrics.stage('stats'):
+                                self.write_stats(args)
+                    if args.mode == 'enrich' or args.enrich:
+                        with self.metrics.stage('enrich'):
+                            await self.enrich(session, args.enrich_ttl, limit=args.enrich_limit)
+                if args.export:
+                    with self.metrics.stage('export'):
+                        self.export_dataset(args)
+            finally:
+                self.report_metrics(args.metrics_json, args.metrics_prom)
+
+    def export_dataset(self, args: argparse.Namespace) -> int:
+        """按命令行参数导出列式数据集"""
+        exporter = DatasetExporter(self.store, args.export_dir, tuple(args.export_format))
+        return exporter.export(full=args.export_full)
+
+    def write_stats(self, args: argparse.Namespace) -> Dict:
+        """按命令行参数生成统计报告"""
+        return StatsReport(self.store, args.top).write(args.stats_output, args.stats_json)
+
+    def run_query(self, args: argparse.Namespace):
+        """执行查询子命令，结果输出到标准输出"""
+        self.load_store(args.db, DEFAULT_SHARD_DIR)
+        try:
+            started = time.perf_counter()
+            records = self.store.query(
+                years=self.process_year_input(args.year) if args.year else None,
+                months=self.process_month_input(args.month) if args.month else None,
+                min_score=args.min_score, min_votes=args.min_votes, title=args.title,
+                order=args.sort, limit=args.limit)
+            elapsed = (time.perf_counter() - started) * 1000
+        finally:
+            self.store.close()
+
+        if args.format == 'json':
+            for record in records:
+                print(json.dumps(dict(record.as_row(), url=record.url), ensure_ascii=False))
+        else:
+            print(MARKDOWN_TABLE_HEADER + ''.join(self.iter_markdown_rows(records)), end='')
+        logging.info(f"🔍 查询完成 | 结果: {len(records)} 条 | 耗时: {elapsed:.1f} ms")
+
+    def run_history(self, args: argparse.Namespace):
+        """执行评分历史子命令，结果输出到标准输出"""
+        self.load_store(args.db, DEFAULT_SHARD_DIR)
+        try:
+            if args.subjects:
+                histories = self.store.history(args.subjects)
+                order = [subject_id for subject_id in dict.fromkeys(args.subjects) if subject_id in histories]
+            else:
+                histories = self.store.season_history(args.year, args.season - 1 if args.season else None)
+                order = list(histories)
+            records = self.store.fetch(order)
+            subjects, points, size = self.store.history_size()
+        finally:
+            self.store.close()
+        if not args.subjects:
+            order.sort(key=lambda subject_id: (records[subject_id].month, records[subject_id].day, subject_id))
+
+        if args.format == 'json':
+            for subject_id in order:
+                print(json.dumps({'subject_id': subject_id, 'title': records[subject_id].title,
+                                  'points': [point.as_row() for point in histories[subject_id]]},
+                                 ensure_ascii=False))
+        else:
+            lines = ["| 条目 | 时间 | 评分 | 评分人数 |\n| --- | --- | --- | --- |\n"]
+            for subject_id in order:
+                link = f"[{escape_markdown_cell(records[subject_id].title)}]({records[subject_id].url})"
+                for point in histories[subject_id]:
+                    score = f"{point.score:.1f}" if point.score is not None else '-'
+                    lines.append(f"| {link} | {time.strftime('%Y-%m-%d %H:%M', time.localtime(point.at))} | "
+                                 f"{score} | {point.votes} |\n")
+                    link = ''
+            print(''.join(lines), end='')
+        logging.info(f"📉 评分历史 | 条目: {len(order)} 个 | 存储: {subjects} 个条目、{points} 个观测点、"
+                     f"{size / 1024:.1f} KB")
+
+    def report_metrics(self, json_path: str = None, prom_path: str = None):
+        """输出本次运行的指标摘要（JSON），并按需写入文件和 Prometheus textfile"""
+        summary = self.metrics.summary()
+        logging.info(f"📊 运行指标: {json.dumps(summary, ensure_ascii=False)}")
+        for path in filter(None, (json_path, prom_path)):
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        if json_path:
+            with atomic_write(json_path) as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+        if prom_path:
+            self.metrics.write_prometheus(prom_path)
 
     @staticmethod
     def process_year_input(input_str: str) -> Tuple[int, int]:
@@ -589,15 +3495,80 @@ class BangumiScraper:
         return (int(input_str), int(input_str))
 
 
-async def run():
+def parse_listing_page(body: bytes, year: int, month: int = None,
+                       backend: str = DEFAULT_PARSER) -> Tuple[int, List[AnimeRecord]]:
+    """解析列表页原始HTML，返回 (总页数, 条目列表)；为模块级函数以便在进程池中执行"""
+    if backend == 'lxml':
+        total_pages = BangumiScraper.parse_page_count_lxml(body)
+        items = BangumiScraper.parse_page_lxml(body, year, month)
+    else:
+        soup = BeautifulSoup(body, 'lxml')
+        total_pages = BangumiScraper.parse_page_count(soup)
+        items = BangumiScraper.parse_page(soup, year, month)
+    return total_pages, items
+
+
+def parse_subject_page(subject_id: int, body: bytes) -> SubjectDetail:
+    """解析条目详情页的信息框、标签和排名；为模块级函数以便在进程池中执行"""
+    detail = SubjectDetail(subject_id)
+    root = lxml_html.document_fromstring(body.decode('utf-8', 'replace'))
+    for item in XPATH_INFOBOX_ITEMS(root):
+        key, sep, value = item.text_content().replace('：', ':').partition(':')
+        key, value = key.strip(), value.strip()
+        if not sep or not value:
+            continue
+        if key in SUBJECT_STUDIO_KEYS and not detail.studio:
+            detail.studio = value
+        elif key in SUBJECT_AIR_DATE_KEYS and not detail.air_date:
+            detail.air_date = SubjectDetail.parse_air_date(value)
+    detail.tags = [tag.strip() for tag in XPATH_SUBJECT_TAGS(root) if tag.strip()]
+    if rank := RANK_PATTERN.search(''.join(XPATH_SUBJECT_RANK(root))):
+        detail.rank = int(rank.group(1))
+    return detail
+
+
+def make_thumbnail(body: bytes, size: Tuple[int, int] = COVER_THUMB_SIZE) -> Optional[bytes]:
+    """生成 JPEG 缩略图（可在进程池中执行）；未安装 Pillow 或图片无法解码时返回 None"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(body)) as image:
+            image.thumbnail(size)
+            output = io.BytesIO()
+            image.convert('RGB').save(output, 'JPEG', quality=COVER_THUMB_QUALITY, optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return output.getvalue()
+
+
+def create_parse_executor(kind: str, workers: int = None) -> Optional[Executor]:
+    """创建列表页解析执行器，inline 表示在事件循环中直接解析
+
+    进程池在首次提交任务时才启动子进程，此时 aiohttp 的解析线程等已经存在，
+    因此不使用 fork（有线程时 fork 可能死锁），优先使用 forkserver，不支持时使用 spawn。
+    """
+    if kind == 'process':
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='parse')
+    return None
+
+
+async def run() -> int:
+    """运行命令行入口，返回进程退出码：出错时为 1，以便 CI、cron 和协调者感知失败"""
     try:
-        async with BangumiScraper() as scraper:
-            await scraper.main()
+        await BangumiScraper().main()
     except aiohttp.ClientError as e:
         logging.error(f"网络请求错误: {str(e)}")
+        return 1
     except Exception as e:
         logging.error(f"未知错误: {str(e)}", exc_info=True)
+        return 1
+    return 0
 
 
 if __name__ == "__main__":
-    asyncio.run(run())
+    sys.exit(asyncio.run(run()))
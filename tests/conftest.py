@@ -0,0 +1,5 @@
+import os
+import sys
+
+# pull.py 是仓库根目录下的单文件脚本，测试直接导入它
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
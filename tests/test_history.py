@@ -0,0 +1,44 @@
+import pull
+from pull import AnimeRecord, AnimeStore, decode_deltas, encode_deltas, history_point
+
+
+def test_deltas_round_trip():
+    points = [(0, -1, 0), (29_000_000, 755, 12), (29_000_060, 731, 3_000_000), (29_000_061, -1, 0)]
+    assert decode_deltas(encode_deltas(points)) == points
+
+
+def test_deltas_empty():
+    assert encode_deltas([]) == b''
+    assert decode_deltas(b'') == []
+
+
+def test_deltas_small_changes_take_one_byte_each():
+    """相邻观测点差值很小时每个分量只占一个字节"""
+    blob = encode_deltas([(100, 700, 50), (101, 699, 52)], previous=(100, 700, 50))
+    assert len(blob) == 6
+
+
+def test_deltas_append_matches_single_encoding():
+    """追加编码（previous 为已有序列的最后一点）与一次性编码的结果相同"""
+    points = [(10, 650, 1), (20, 700, 40), (35, 690, 41), (36, 812, 9_999)]
+    appended = encode_deltas(points[:2]) + encode_deltas(points[2:], previous=points[1])
+    assert appended == encode_deltas(points)
+    assert decode_deltas(appended) == points
+
+
+def test_history_point():
+    assert history_point(125.0, 7.55, 10) == (2, 755, 10)
+    assert history_point(59.9, None, None) == (0, -1, 0)
+
+
+def test_store_appends_only_changed_scores(tmp_path):
+    store = AnimeStore(str(tmp_path / 'bangumi.db'))
+    try:
+        store.upsert([AnimeRecord(1, title='甲', year=2024, score=7.1, votes=10)])
+        store.upsert([AnimeRecord(1, title='甲', year=2024, score=7.1, votes=10)])
+        store.upsert([AnimeRecord(1, title='甲', year=2024, score=7.4, votes=25)])
+        points = store.history([1])[1]
+    finally:
+        store.close()
+    assert [(point.score, point.votes) for point in points] == [(7.1, 10), (7.4, 25)]
+    assert all(point.at % pull.HISTORY_TIME_UNIT == 0 for point in points)
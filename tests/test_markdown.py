@@ -0,0 +1,46 @@
+import pytest
+
+from pull import MARKDOWN_TABLE_HEADER, AnimeRecord, BangumiScraper, split_markdown_row
+
+
+def write_report(path, rows):
+    path.write_text('# 2025年\n\n' + MARKDOWN_TABLE_HEADER + ''.join(rows), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def scraper():
+    return BangumiScraper()
+
+
+def test_rows_round_trip_with_pipes(tmp_path, scraper):
+    records = [
+        AnimeRecord(560961, title='《鸣潮》动画短片 | 天明', jp_title='天明', cover='https://lain.bgm.tv/c.jpg',
+                    year=2025, month=5, day=28, episodes=1, score=7.5, votes=120),
+        AnimeRecord(576071, title='饿狼传说 × 街头霸王 | 动画预告', jp_title='餓狼伝説 | アニメーショントレーラー',
+                    year=2025, month=8),
+        AnimeRecord(1, title='普通标题', jp_title='', year=2025),
+    ]
+    path = write_report(tmp_path / '2025.md', BangumiScraper.iter_markdown_rows(records))
+    assert scraper.parse_existing_markdown(path) == records
+
+
+def test_rendered_pipes_are_escaped():
+    [row] = BangumiScraper.iter_markdown_rows([AnimeRecord(1, title='a | b', jp_title='c|d', year=2025)])
+    assert '[a \\| b](https://bangumi.tv/subject/1)' in row
+    assert '| c\\|d |' in row
+
+
+def test_legacy_unescaped_title_keeps_subject(tmp_path, scraper):
+    """修复前生成的报告中标题里的 | 未转义，链接仍作为一个单元格，条目不会丢失"""
+    row = ('| 2026-04-18 | ![](https://lain.bgm.tv/642404.jpg) | '
+           '[《洛克王国：世界》概念动画短片 | 王国的夏日清风](https://bangumi.tv/subject/642404) | 王国的夏日清风 | 1 | 0 |\n')
+    [record] = scraper.parse_existing_markdown(write_report(tmp_path / '2026.md', [row]))
+    assert record.subject_id == 642404
+    assert record.title == '《洛克王国：世界》概念动画短片 | 王国的夏日清风'
+    assert (record.year, record.month, record.day) == (2026, 4, 18)
+
+
+def test_split_markdown_row():
+    assert split_markdown_row('| a | [b | c](u) | d\\|e |  |') == ['a', '[b | c](u)', 'd|e', '']
+    assert split_markdown_row('not a row') == []
@@ -0,0 +1,95 @@
+import pytest
+
+import pull
+from pull import AnimeRecord, ShardQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = ShardQueue(str(tmp_path / 'spool'))
+    yield queue
+    queue.close()
+
+
+def test_claim_order_and_exhaustion(queue):
+    assert queue.plan([(2023, 1), (2024, 2), (2024, None)]) == 3
+    claimed = [queue.claim('w1') for _ in range(3)]
+    assert claimed == [(2024, 2), (2024, None), (2023, 1)]
+    assert queue.claim('w1') is None
+    assert queue.claimable() == 0
+
+
+def test_complete_writes_results(queue):
+    queue.plan([(2024, 4)])
+    year, month = queue.claim('w1')
+    queue.complete(year, month, [AnimeRecord(7, title='a | b', year=2024, month=4)])
+    assert queue.counts() == {'done': 1}
+    [(result_year, result_month, records)] = list(queue.iter_results())
+    assert (result_year, result_month) == (2024, 4)
+    assert records[0].subject_id == 7 and records[0].title == 'a | b'
+    queue.mark_merged(2024, 4)
+    assert list(queue.iter_results()) == []
+
+
+def test_fail_requeues_until_max_attempts(queue):
+    queue.plan([(2024, 1)])
+    for attempt in range(1, pull.SHARD_MAX_ATTEMPTS + 1):
+        assert queue.claim('w1') == (2024, 1)
+        queue.fail(2024, 1)
+        expected = 'failed' if attempt == pull.SHARD_MAX_ATTEMPTS else 'pending'
+        assert queue.counts() == {expected: 1}
+    assert queue.claim('w1') is None
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = ShardQueue(str(tmp_path / 'spool'), lease=-1)  # 租约立即过期，模拟工作进程崩溃
+    try:
+        queue.plan([(2024, 1)])
+        assert queue.claim('crashed') == (2024, 1)
+        assert queue.claimable() == 1
+        assert queue.claim('w2') == (2024, 1)
+    finally:
+        queue.close()
+
+
+def test_expired_lease_with_exhausted_attempts_fails(tmp_path):
+    queue = ShardQueue(str(tmp_path / 'spool'), lease=-1)
+    try:
+        queue.plan([(2024, 1)])
+        for i in range(pull.SHARD_MAX_ATTEMPTS):
+            assert queue.claim(f'crashed-{i}') == (2024, 1)
+        assert queue.claimable() == 0
+        assert queue.claim('w2') is None
+        assert queue.counts() == {'failed': 1}
+    finally:
+        queue.close()
+
+
+def test_coordinator_expire_marks_exhausted_shards(tmp_path):
+    queue = ShardQueue(str(tmp_path / 'spool'), lease=-1)
+    try:
+        queue.plan([(2024, 1)])
+        for i in range(pull.SHARD_MAX_ATTEMPTS):
+            queue.claim(f'crashed-{i}')
+        queue.expire()
+        assert queue.counts() == {'failed': 1}
+    finally:
+        queue.close()
+
+
+def test_renew_ignores_other_workers(queue):
+    queue.plan([(2024, 1)])
+    queue.claim('w1')
+    before = queue.conn.execute('SELECT lease_until FROM shard').fetchone()[0]
+    queue.renew(2024, 1, 'w2')
+    assert queue.conn.execute('SELECT lease_until FROM shard').fetchone()[0] == before
+
+
+def test_plan_resume_keeps_state(queue):
+    queue.plan([(2024, 1), (2024, 2)])
+    year, month = queue.claim('w1')
+    queue.complete(year, month, [])
+    assert queue.plan([(2024, 1), (2024, 2)], reset=False) == 2
+    assert queue.counts() == {'done': 1, 'pending': 1}
+    queue.plan([(2024, 1), (2024, 2)])
+    assert queue.counts() == {'pending': 2}